@@ -1,2 +1,11 @@
 from .async_callback_manager import AsyncCallbackManager
-from .base_db_storage import SQLiteStorage
\ No newline at end of file
+from .base_db_storage import SQLiteStorage, CallbackDataStorage, CallbackRecord
+from .cached_storage import CachedStorage
+from .memory_storage import MemoryStorage
+from .sharded_storage import ShardedSQLiteStorage
+from .quota_storage import QuotaStorage
+from .remote_storage import StorageServer, RemoteStorage, RemoteStorageError
+from .metrics import MetricsRegistry
+from .scheduler import DispatchScheduler, DispatchOverloaded
+from .serializers import Serializer, PickleSerializer, JsonSerializer, CompactSerializer, CompressedSerializer
+from .sources import PageSource, ListSource, CallableSource, AsyncIterableSource
@@ -1,21 +1,66 @@
 import asyncio
+import base64
 import hashlib
-import inspect
-import json
-import pickle
 import time
 import traceback
+from collections import OrderedDict
+from concurrent.futures import Executor
 from dataclasses import is_dataclass, asdict
 from functools import wraps
 from math import ceil
-from typing import Any, Callable, Dict, Optional, List, Union
+from typing import Any, AsyncIterable, Callable, Dict, Optional, List, Set, Tuple, Union
 
 from aiogram import Router, types
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.event.handler import FilterObject
 from aiogram.types import CallbackQuery, InlineKeyboardButton
 
-from .base_db_storage import SQLiteStorage, CallbackDataStorage
+from .base_db_storage import SQLiteStorage, CallbackDataStorage, CallbackRecord, COMPACT_DIGEST_SIZE
+from .handler_object import _HandlerObject
+from .inline_data import INLINE_PREFIX, BACK_BTN_INDEX, encode_inline, decode_inline
 from .logger import logger
 from .messages import MockMessage
+from .metrics import MetricsRegistry
+from .scheduler import DispatchScheduler, DispatchOverloaded
+from .serializers import Serializer, JsonSerializer, PickleSerializer
+from .sources import PageSource, as_page_source
+
+# Префикс кнопок элементов, ссылающихся на общий снимок страницы списка
+SNAPSHOT_PREFIX = "cs_"
+# Префикс кнопок пагинации: общий контекст навигации и номер страницы в callback_data
+PAGE_PREFIX = "cp_"
+# Префиксы callback_data, которые обрабатывает менеджер
+_CALLBACK_PREFIXES = ("cb_", INLINE_PREFIX, SNAPSHOT_PREFIX, PAGE_PREFIX)
+# Длина короткого идентификатора обработчика в inline callback_data (байт)
+_INLINE_ID_SIZE = 4
+# Результат нажатия, отклоненного планировщиком: обработчик не запускался
+_SHED = object()
+
+
+def _serialize(serializer: Serializer, data: Dict[str, Any], hash_key: Optional[bytes] = None) -> Tuple[str, bytes]:
+    # Сериализация данных
+    data_bytes = serializer.dumps(data)
+
+    if hash_key is None:
+        # Создание хэша длиной 32 символа
+        return hashlib.md5(data_bytes).hexdigest(), data_bytes
+
+    # Короткий хэш BLAKE2 с ключом: 16 символов base64url
+    digest = hashlib.blake2b(data_bytes, digest_size=COMPACT_DIGEST_SIZE, key=hash_key).digest()
+    return base64.urlsafe_b64encode(digest).decode(), data_bytes
+
+
+def _serialize_many(
+        serializer: Serializer,
+        datas: List[Dict[str, Any]],
+        hash_key: Optional[bytes] = None
+) -> List[Tuple[str, bytes]]:
+    # Функции уровня модуля, чтобы их можно было передать и в пул процессов
+    return [_serialize(serializer, data, hash_key) for data in datas]
+
+
+def _deserialize(serializer: Serializer, data_bytes: bytes) -> Any:
+    return serializer.loads(data_bytes)
 
 
 class AsyncCallbackManager:
@@ -25,13 +70,41 @@ class AsyncCallbackManager:
             storage: CallbackDataStorage = None,
             auto_clean: bool = False,
             expiry_time: int = 3600,
-            pause_between_cleaning: int = 3600
+            pause_between_cleaning: int = 3600,
+            inline_callback_data: bool = False,
+            serializer: Optional[Serializer] = None,
+            snapshot_lists: bool = False,
+            parametric_pagination: bool = False,
+            metrics: Optional[MetricsRegistry] = None,
+            offload_threshold: Optional[int] = None,
+            executor: Optional[Executor] = None,
+            hash_key: Optional[bytes] = None,
+            coalesce_window: Optional[float] = None,
+            scheduler: Optional[DispatchScheduler] = None
     ):
         """
               Инициализация менеджера асинхронных callback'ов.
 
               :param use_json: Использовать JSON для сериализации данных.
               :param storage: Экземпляр хранилища для callback данных.
+              :param auto_clean: Периодически удалять устаревшие данные, начиная с запуска менеджера.
+              :param inline_callback_data: Упаковывать небольшие аргументы прямо в callback_data, без хранилища.
+                                           Требует hash_key: без ключа callback_data можно подделать.
+              :param serializer: Сериализатор данных; по умолчанию pickle или JSON в зависимости от use_json.
+              :param snapshot_lists: Сохранять страницу create_buttons одной записью вместо записи на каждый элемент.
+              :param parametric_pagination: Сохранять контекст пагинации один раз, а номер страницы
+                                            передавать в callback_data.
+              :param metrics: Реестр метрик; передается и в хранилище. По умолчанию метрики выключены.
+              :param offload_threshold: Размер данных в байтах, начиная с которого сериализация, хэширование
+                                        и десериализация выполняются в executor, а не в event loop.
+              :param executor: Пул потоков или процессов для offload_threshold; по умолчанию пул потоков event loop.
+              :param hash_key: Ключ BLAKE2 (до 64 байт) для коротких хэшей в callback_data: 16 символов вместо 32.
+                               None — md5, как раньше. Кнопки, созданные с другим хэшем, продолжают работать.
+                               Этим же ключом подписывается inline callback_data, чтобы ее нельзя было подделать.
+              :param coalesce_window: Склеивать повторные нажатия той же кнопки тем же пользователем:
+                                      пока первое обрабатывается и еще столько секунд после, повторы только
+                                      получают ответ. None — выключено, 0 — только одновременные нажатия.
+              :param scheduler: Планировщик нажатий: общий лимит одновременной обработки и очереди пользователей.
         """
         if storage is None:
             if use_json is True:
@@ -39,50 +112,166 @@ class AsyncCallbackManager:
             else:
                 storage = SQLiteStorage('pickle_callback_data.db')
 
+        self.auto_clean = auto_clean
         self.expiry_time = expiry_time
         self.pause_between_cleaning = pause_between_cleaning
         self.router = Router()
         self.use_json = use_json
-        self._handlers = {}
+        if serializer is None:
+            serializer = JsonSerializer() if use_json else PickleSerializer()
+        self.serializer = serializer
+        self.offload_threshold = offload_threshold
+        self.executor = executor
+        if hash_key is not None and len(hash_key) > 64:
+            raise ValueError("hash_key must be at most 64 bytes")
+        if inline_callback_data and hash_key is None:
+            # Без ключа метку пользователя и id обработчика может вычислить кто угодно
+            raise ValueError("inline_callback_data requires hash_key")
+        self.hash_key = hash_key
+        self.coalesce_window = coalesce_window
+        # Нажатия в обработке и время завершения недавних; ключ — (user_id, callback_data)
+        self._in_flight: Set[Tuple[int, str]] = set()
+        self._recent_clicks: "OrderedDict[Tuple[int, str], float]" = OrderedDict()
+        self.scheduler = scheduler
+        # Размер последних данных каждого обработчика: по нему решается, сериализовать ли в executor
+        self._payload_sizes: Dict[str, int] = {}
+        self.snapshot_lists = snapshot_lists
+        self.parametric_pagination = parametric_pagination
+        self._handlers: Dict[str, _HandlerObject] = {}
+        self.inline_callback_data = inline_callback_data
+        self._inline_handlers: Dict[bytes, _HandlerObject] = {}
         self.storage = storage
+        if metrics is not None:
+            storage.metrics = metrics
+        self.metrics = storage.metrics
+        if scheduler is not None:
+            scheduler.metrics = self.metrics
+        self._started = False
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._clean_task: Optional[asyncio.Task] = None
 
         async def noop_callback(callback_query: CallbackQuery):
             await callback_query.answer()
 
         self.router.callback_query.register(noop_callback, lambda c: c.data == "noop")
-        asyncio.get_event_loop().run_until_complete(self.init_db())
+        # Единственная регистрация: конкретный обработчик выбирается по handler_id из таблицы _handlers
+        self.router.callback_query.register(
+            self.main_callback_handler,
+            lambda c: c.data is not None and c.data.startswith(_CALLBACK_PREFIXES)
+        )
+        # Хранилище открывается при запуске диспетчера или при первом обращении к нему
+        self.router.startup.register(self.start)
+        self.router.shutdown.register(self.close)
 
-        if auto_clean is True:
-            asyncio.get_event_loop().create_task(self._auto_clean())
+    async def start(self):
+        """
+              Инициализирует хранилище и запускает автоочистку. Повторные вызовы ничего не делают.
+        """
+        if self._started:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._started:
+                return
+            await self.storage.init_db()
+            if self.auto_clean is True:
+                self._clean_task = asyncio.get_running_loop().create_task(self._auto_clean())
+            self._started = True
+
+    async def close(self):
+        """
+              Останавливает автоочистку и закрывает хранилище.
+        """
+        if not self._started:
+            return
+        self._started = False
+        if self._clean_task is not None:
+            self._clean_task.cancel()
+            try:
+                await self._clean_task
+            except asyncio.CancelledError:
+                pass
+            self._clean_task = None
+        await self.storage.close()
 
     async def init_db(self):
-        await self.storage.init_db()
-
-    async def _save_callback_data(self, data: Dict[str, Any], user_id: int) -> str:
-        # Сериализация данных
-        if self.use_json:
-            if is_dataclass(data):
-                data = asdict(data)
-            data_bytes = json.dumps(data, ensure_ascii=False).encode()
+        await self.start()
+
+    def _serialize_callback_data(self, data: Dict[str, Any]) -> Tuple[str, bytes]:
+        with self.metrics.timer("serialize_seconds"):
+            return _serialize(self.serializer, data, self.hash_key)
+
+    async def _serialize_many_callback_data(self, datas: List[Dict[str, Any]]) -> List[Tuple[str, bytes]]:
+        # Размер заранее неизвестен, поэтому оценивается по прошлым данным тех же обработчиков
+        if (
+                self.offload_threshold is None
+                or sum(self._payload_sizes.get(data.get('handler_id'), 0) for data in datas) < self.offload_threshold
+        ):
+            results = [self._serialize_callback_data(data) for data in datas]
         else:
-            data_bytes = pickle.dumps(data)
+            # Вся страница уходит в executor одной задачей
+            with self.metrics.timer("serialize_seconds"):
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, _serialize_many, self.serializer, datas, self.hash_key
+                )
+
+        if self.offload_threshold is not None:
+            for data, (_, data_bytes) in zip(datas, results):
+                self._payload_sizes[data.get('handler_id')] = len(data_bytes)
+        return results
 
-        # Создание хэша длиной 64 символа
-        data_hash = hashlib.md5(data_bytes).hexdigest()
+    async def _save_callback_data(self, data: Dict[str, Any], user_id: int, ttl: Optional[float] = None) -> str:
+        (data_hash, data_bytes), = await self._serialize_many_callback_data([data])
         timestamp = time.time()
+        expires_at = timestamp + ttl if ttl is not None else None
 
         # Сохранение в базу данных
-        await self.storage.save(data_hash, data_bytes, timestamp, user_id)
+        if not self._started:
+            await self.start()
+        with self.metrics.timer("save_seconds"):
+            if expires_at is None:
+                # Хранилища, написанные до появления button_ttl, принимают 4 аргумента
+                await self.storage.save(data_hash, data_bytes, timestamp, user_id)
+            else:
+                await self.storage.save(data_hash, data_bytes, timestamp, user_id, expires_at=expires_at)
         return data_hash
 
+    async def _save_many_callback_data(
+            self,
+            datas: List[Dict[str, Any]],
+            user_id: int,
+            ttl: Optional[float] = None
+    ) -> List[str]:
+        timestamp = time.time()
+        expires_at = timestamp + ttl if ttl is not None else None
+        hashes = []
+        records = {}
+        for data_hash, data_bytes in await self._serialize_many_callback_data(datas):
+            hashes.append(data_hash)
+            # Одинаковые кнопки на странице сохраняются один раз
+            records[data_hash] = CallbackRecord(data_hash, data_bytes, timestamp, user_id, expires_at)
+
+        # Сохранение всей страницы одной транзакцией
+        if not self._started:
+            await self.start()
+        with self.metrics.timer("save_seconds"):
+            await self.storage.save_many(list(records.values()))
+        return hashes
+
     async def _load_callback_data(self, data_hash: str, user_id: int) -> Optional[Dict[str, Any]]:
-        data_bytes = await self.storage.load(data_hash, user_id)
+        if not self._started:
+            await self.start()
+        with self.metrics.timer("load_seconds"):
+            data_bytes = await self.storage.load(data_hash, user_id)
         if data_bytes is not None:
-            if self.use_json:
-                data = json.loads(data_bytes.decode())
-            else:
-                data = pickle.loads(data_bytes, encoding="utf-8")
-            return data
+            # Формат определяется по самим данным, поэтому старые записи остаются читаемыми
+            with self.metrics.timer("deserialize_seconds"):
+                if self.offload_threshold is not None and len(data_bytes) >= self.offload_threshold:
+                    return await asyncio.get_running_loop().run_in_executor(
+                        self.executor, _deserialize, self.serializer, data_bytes
+                    )
+                return self.serializer.loads(data_bytes)
         return None
 
     async def _auto_clean(self):
@@ -92,32 +281,95 @@ class AsyncCallbackManager:
 
     async def clean_old_callback_data(self, expiry_time: int = 3600):
         # Удаление записей старше expiry_time секунд
-        current_time = time.time()
+        if not self._started:
+            await self.start()
         return await self.storage.clean_old(expiry_time)
 
-    async def main_callback_handler(self, callback_query: CallbackQuery, callback_data=None, *args):
+    async def collect_metrics(self) -> str:
+        """
+              Обновляет размер хранилища в метриках и возвращает их в текстовом формате Prometheus.
+        """
+        if not self._started:
+            await self.start()
+        for name, value in (await self.storage.stats()).items():
+            self.metrics.set(f"storage_{name}", value)
+        return self.metrics.render_prometheus()
+
+    async def main_callback_handler(self, callback_query: CallbackQuery, callback_data=None, *args, **middleware_data):
         logger.debug(f"New request with callback data \"{callback_query.data}\"")
 
         if not callback_data:
             callback_data = callback_query.data
 
-        if not callback_data.startswith("cb_"):
+        if not callback_data.startswith(_CALLBACK_PREFIXES):
             return  # Не обрабатываем callback_data, не относящиеся к нашему модулю
 
-        data_hash = callback_data[3:]  # Убираем префикс "cb_"
-        # Загрузка данных из базы по хэшу
-        data = await self._load_callback_data(data_hash, callback_query.from_user.id)
+        self.metrics.inc("clicks_total")
+        if self.coalesce_window is None:
+            result = await self._schedule_callback(callback_query, callback_data, middleware_data)
+            return None if result is _SHED else result
+
+        key = (callback_query.from_user.id, callback_data)
+        if key in self._in_flight or self._clicked_recently(key):
+            # Повторное нажатие: данные не загружаются и обработчик не вызывается еще раз
+            self.metrics.inc("coalesced_clicks_total")
+            await callback_query.answer()
+            return
+
+        self._in_flight.add(key)
+        try:
+            result = await self._schedule_callback(callback_query, callback_data, middleware_data)
+        finally:
+            self._in_flight.discard(key)
+        if result is _SHED:
+            # Пользователя попросили повторить нажатие, повтор не должен склеиться с отклоненным
+            return None
+        # Нажатие, не прошедшее фильтры, обрабатывают другие роутеры, его повторы не склеиваются
+        if self.coalesce_window > 0 and result is not UNHANDLED:
+            self._recent_clicks[key] = time.monotonic()
+            self._recent_clicks.move_to_end(key)
+        return result
+
+    async def _schedule_callback(self, callback_query: CallbackQuery, callback_data: str, middleware_data: dict):
+        if self.scheduler is None:
+            return await self._dispatch_callback(callback_query, callback_data, middleware_data)
+        try:
+            return await self.scheduler.submit(
+                callback_query.from_user.id,
+                lambda: self._dispatch_callback(callback_query, callback_data, middleware_data)
+            )
+        except DispatchOverloaded:
+            # Быстрый ответ вместо ожидания в переполненной очереди
+            self.metrics.inc("dispatch_shed_total")
+            await callback_query.answer(MockMessage.Overloaded)
+            return _SHED
+
+    def _clicked_recently(self, key: Tuple[int, str]) -> bool:
+        # Записи упорядочены по времени завершения, устаревшие удаляются с начала
+        border = time.monotonic() - self.coalesce_window
+        while self._recent_clicks and next(iter(self._recent_clicks.values())) < border:
+            self._recent_clicks.popitem(last=False)
+        return key in self._recent_clicks
+
+    async def _dispatch_callback(self, callback_query: CallbackQuery, callback_data: str, middleware_data: dict):
+        data = await self._resolve_callback_data(callback_data, callback_query.from_user.id)
         if data is None:
+            self.metrics.inc("data_invalid_total")
             await callback_query.answer(MockMessage.DataInvalid, show_alert=True)
             return
 
         handler_id = data.get('handler_id')
-        respose = self._handlers.get(handler_id)
-        if respose is None:
+        handler = self._handlers.get(handler_id)
+        if handler is None:
+            self.metrics.inc("handler_not_found_total")
             await callback_query.answer(MockMessage.HandlerNotFound, show_alert=True)
             return
 
-        handler = respose["func"]
+        # Фильтры обработчика; если не прошли, событие уходит дальше по роутерам aiogram
+        if handler.filters:
+            check, _ = await handler.check(callback_query, **middleware_data)
+            if not check:
+                return UNHANDLED
 
         # Получение аргументов
         args = data.get('args', [])
@@ -126,21 +378,115 @@ class AsyncCallbackManager:
 
         # Вызов обработчика
         try:
-            t = inspect.signature(handler)
-            if back_btn_data and 'back_btn' in t.parameters:
+            if back_btn_data and handler.accepts_back_btn:
                 kwargs['back_btn'] = InlineKeyboardButton(text='Назад', callback_data=back_btn_data)
-            await handler(callback_query, *args, **kwargs)
+            with self.metrics.timer("handler_seconds"):
+                await handler.callback(callback_query, *args, **kwargs)
         except Exception as _:
+            self.metrics.inc("handler_errors_total")
             traceback.print_exc()
             await callback_query.answer(MockMessage.RequestProcessingError, show_alert=True)
 
+    async def _resolve_callback_data(self, callback_data: str, user_id: int) -> Optional[Dict[str, Any]]:
+        if callback_data.startswith(INLINE_PREFIX):
+            # Данные упакованы в саму callback_data, хранилище не нужно
+            return self._decode_inline_data(callback_data, user_id)
+
+        if callback_data.startswith(SNAPSHOT_PREFIX):
+            return await self._load_snapshot_element(callback_data, user_id)
+
+        if callback_data.startswith(PAGE_PREFIX):
+            return await self._load_page(callback_data, user_id)
+
+        data_hash = callback_data[3:]  # Убираем префикс "cb_"
+        # Загрузка данных из базы по хэшу
+        return await self._load_callback_data(data_hash, user_id)
+
+    async def _load_snapshot_element(self, callback_data: str, user_id: int) -> Optional[Dict[str, Any]]:
+        data_hash, _, index = callback_data[len(SNAPSHOT_PREFIX):].rpartition(":")
+        if not index.isdigit():
+            return None
+
+        snapshot = await self._load_callback_data(data_hash, user_id)
+        if snapshot is None:
+            return None
+        elements = snapshot.pop('elements', ())
+        if int(index) >= len(elements):
+            return None
+
+        # Общие аргументы страницы плюс выбранный элемент
+        snapshot['kwargs'] = dict(snapshot.get('kwargs', {}), element=elements[int(index)])
+        return snapshot
+
+    async def _load_page(self, callback_data: str, user_id: int) -> Optional[Dict[str, Any]]:
+        data_hash, _, page = callback_data[len(PAGE_PREFIX):].rpartition(":")
+        if not page.isdigit():
+            return None
+
+        record = await self._load_callback_data(data_hash, user_id)
+        if record is None:
+            return None
+        # Контекст навигации хранится отдельной записью или внутри снимка страницы
+        context = record.get('pages', record)
+        context.pop('elements', None)
+        context['kwargs'] = dict(context.get('kwargs', {}), page=int(page))
+        return context
+
+    def _encode_inline_data(self, data: Dict[str, Any], user_id: int) -> Optional[str]:
+        handler = self._handlers.get(data['handler_id'])
+        if handler is None or handler.inline_id is None:
+            return None
+
+        # Имена аргументов заменяются индексами параметров обработчика
+        kwargs = {}
+        for name, value in data['kwargs'].items():
+            if name not in handler.param_names:
+                return None
+            kwargs[handler.param_names.index(name)] = value
+        if data['back_btn'] is not None:
+            kwargs[BACK_BTN_INDEX] = data['back_btn']
+        if max(kwargs, default=0) > BACK_BTN_INDEX or len(handler.param_names) > BACK_BTN_INDEX:
+            return None
+
+        return encode_inline(handler.inline_id, data['args'], kwargs, user_id, self.hash_key)
+
+    def _decode_inline_data(self, callback_data: str, user_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            inline_id, args, indexed_kwargs = decode_inline(callback_data, _INLINE_ID_SIZE, user_id, self.hash_key)
+        except (ValueError, IndexError, UnicodeDecodeError):
+            return None
+
+        handler = self._inline_handlers.get(inline_id)
+        if handler is None:
+            return None
+
+        back_btn = indexed_kwargs.pop(BACK_BTN_INDEX, None)
+        try:
+            kwargs = {handler.param_names[index]: value for index, value in indexed_kwargs.items()}
+        except IndexError:
+            return None
+        return {'handler_id': handler.handler_id, 'args': args, 'kwargs': kwargs, 'back_btn': back_btn}
+
     def register_handler(self, func: Callable, *filters):
         handler_id = self._generate_handler_id(func)
-        self._handlers[handler_id] = {
-            "func": func,
-            "filters": list(filters) + [lambda c: c.data and c.data.startswith("cb_")]
-        }
-        self.router.callback_query.register(self.main_callback_handler, *filters)
+        handler = _HandlerObject(
+            callback=func,
+            filters=[FilterObject(f) for f in filters],
+            handler_id=handler_id
+        )
+        self._handlers[handler_id] = handler
+
+        # Короткий идентификатор для inline callback_data; при коллизии обработчик работает только через хранилище.
+        # Аргументы в inline callback_data хранятся по индексу параметра, поэтому в идентификатор входит сигнатура:
+        # после изменения параметров обработчика старые кнопки не передадут значения не тем аргументам
+        signature = f"{handler_id}:{','.join(handler.param_names)}".encode()
+        inline_id = hashlib.blake2b(signature, digest_size=_INLINE_ID_SIZE).digest()
+        registered = self._inline_handlers.get(inline_id)
+        if registered is None or registered.handler_id == handler_id:
+            handler.inline_id = inline_id
+            self._inline_handlers[inline_id] = handler
+        else:
+            registered.inline_id = None
         return func
 
     def callback_handler(self, *filters):
@@ -149,15 +495,8 @@ class AsyncCallbackManager:
             async def wrapper(callback_query: CallbackQuery, *filters, **kwargs):
                 await func(callback_query, *filters, **kwargs)
 
-            # Генерируем уникальный идентификатор для обработчика
-            handler_id = self._generate_handler_id(func)
-
-            # Сохраняем обработчик в словаре с использованием handler_id
-            self._handlers[handler_id] = {
-                "func": func,
-                "filters": list(filters) + [lambda c: c.data and c.data.startswith("cb_")]
-            }
-            self.router.callback_query.register(self.main_callback_handler, *filters)
+            # Сохраняем обработчик в таблице диспетчеризации по handler_id
+            self.register_handler(func, *filters)
             logger.debug(f"Register new callback handler is {func.__name__}")
             return wrapper
 
@@ -192,6 +531,75 @@ class AsyncCallbackManager:
             return back_btn.data
         raise TypeError("Not implemented type")
 
+    def _build_callback_data(
+            self,
+            func: Union[str, Callable],
+            back_btn: Optional[str | types.CallbackQuery | types.Message | InlineKeyboardButton],
+            args: tuple,
+            kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        if self.use_json is True:
+            args = [self._to_storable(arg) for arg in args]
+            kwargs = {key: self._to_storable(value) for key, value in kwargs.items()}
+
+        return {
+            'handler_id': self._generate_handler_id(func if isinstance(func, str) else func.__name__),
+            'args': args,
+            'kwargs': kwargs,
+            'back_btn': self._extract_callback_data(back_btn),
+        }
+
+    def _to_storable(self, value: Any) -> Any:
+        if self.use_json is True and is_dataclass(value):
+            return asdict(value)
+        return value
+
+    async def _render_buttons(
+            self,
+            specs: List[Tuple[str, Union[None, Dict[str, Any], Tuple[str, int]]]],
+            user_data: Union[int, types.Message | types.CallbackQuery],
+            ttl: Optional[float] = None,
+            shared: Optional[Dict[str, Any]] = None
+    ) -> List[InlineKeyboardButton]:
+        """
+              Создает набор кнопок, сохраняя данные всех кнопок одной транзакцией.
+
+              :param specs: Пары (текст, данные). Данные — None для кнопки "noop", словарь для отдельной записи
+                            или (префикс, номер) для ссылки на общую запись shared.
+              :param user_data: ID пользователя телеграм
+              :param ttl: Время жизни данных кнопок в секундах.
+              :param shared: Общая запись, на которую ссылаются кнопки страницы.
+              :return: Список InlineKeyboardButton в порядке specs.
+        """
+        user_id = self._extract_user_id(user_data)
+        callbacks = []
+        datas = [shared] if shared is not None else []
+        for _, data in specs:
+            if data is None:
+                callbacks.append("noop")
+                continue
+            if isinstance(data, tuple):
+                callbacks.append(data)
+                continue
+            callback_data = self._encode_inline_data(data, user_id) if self.inline_callback_data else None
+            if callback_data is None:
+                datas.append(data)
+            callbacks.append(callback_data)
+
+        # В хранилище попадают только кнопки, не поместившиеся в callback_data
+        hashes = iter(await self._save_many_callback_data(datas, user_id, ttl))
+        shared_hash = next(hashes) if shared is not None else None
+
+        buttons = []
+        for (text, _), callback_data in zip(specs, callbacks):
+            if callback_data is None:
+                callback_data = f"cb_{next(hashes)}"
+            elif isinstance(callback_data, tuple):
+                prefix, number = callback_data
+                callback_data = f"{prefix}{shared_hash}:{number}"
+            buttons.append(InlineKeyboardButton(text=text, callback_data=callback_data))
+        return buttons
+
     async def create_button(
             self,
             text: str,
@@ -199,6 +607,7 @@ class AsyncCallbackManager:
             user_data: Union[int, types.Message | types.CallbackQuery],
             back_btn: Optional[str | types.CallbackQuery | types.Message | InlineKeyboardButton] = None,
             *args,
+            button_ttl: Optional[float] = None,
             **kwargs
     ) -> InlineKeyboardButton:
         """
@@ -208,25 +617,21 @@ class AsyncCallbackManager:
               :param func: Функция-обработчик или ее имя.
               :param user_data: ID пользователя телеграм
               :param back_btn: Кнопка "Назад" или данные для нее.
+              :param button_ttl: Время жизни данных кнопки в секундах (по умолчанию — до очистки по expiry_time).
+                                 Имена back_btn и button_ttl зарезервированы и не передаются в обработчик.
               :return: Экземпляр InlineKeyboardButton.
         """
-        if self.use_json is True:
-            args = [asdict(arg) if is_dataclass(arg) else arg for arg in args]
-            kwargs = {key: asdict(value) if is_dataclass(value) else value for key, value in kwargs.items()}
-
-        data = {
-            'handler_id': self._generate_handler_id(func if isinstance(func, str) else func.__name__),
-            'args': args,
-            'kwargs': kwargs,
-            'back_btn': self._extract_callback_data(back_btn),
-        }
-        data_hash = await self._save_callback_data(data, self._extract_user_id(user_data))
-        callback_data = f"cb_{data_hash}"
+        data = self._build_callback_data(func, back_btn, args, kwargs)
+        user_id = self._extract_user_id(user_data)
+        callback_data = self._encode_inline_data(data, user_id) if self.inline_callback_data else None
+        if callback_data is None:
+            data_hash = await self._save_callback_data(data, user_id, button_ttl)
+            callback_data = f"cb_{data_hash}"
         return InlineKeyboardButton(text=text, callback_data=callback_data)
 
     async def create_buttons(
             self,
-            objects: List,
+            objects: Union[List, PageSource, Callable, AsyncIterable],
             display_func: Callable,
             button_func: Callable,
             user_data: Union[int, types.Message | types.CallbackQuery],
@@ -236,60 +641,78 @@ class AsyncCallbackManager:
             row=False,
             back_btn: Optional[str | CallbackQuery | types.Message] = None,
             *args,
+            button_ttl: Optional[float] = None,
             **kwargs
     ) -> List[InlineKeyboardButton]:
+        """
+              Создает кнопки для страницы списка объектов и кнопки пагинации.
+
+              :param objects: Список объектов, PageSource, async функция (offset, limit) -> (элементы, всего)
+                              или асинхронный итератор с len().
+              :param display_func: Обработчик страницы списка (получает page).
+              :param button_func: Обработчик элемента (получает element).
+              :param user_data: ID пользователя телеграм
+              :param button_ttl: Время жизни данных кнопок в секундах.
+              :return: Строки клавиатуры: элементы страницы и пагинация.
+        """
         keyboards = []
 
-        current_objects = objects[(page - 1) * objects_per_page:page * objects_per_page]
-        pagination_buttons = asyncio.create_task(
-            self.create_paginate_buttons(
-                func=display_func,
-                total_pages=ceil(len(objects) / objects_per_page),
-                current_page=page,
-                back_btn=back_btn,
-                user_data=user_data,
-                *args,
-                **kwargs
-            )
-        )
+        # Загружается только видимая страница
+        current_objects, total = await as_page_source(objects).fetch((page - 1) * objects_per_page, objects_per_page)
 
-        tasks = []
-        for obj in current_objects:
-            kwargs_copy = kwargs.copy()
-            kwargs_copy['element'] = obj
-            tasks.append(
-                asyncio.create_task(
-                    self.create_button(
-                        text=text_func(obj),
-                        func=button_func,
-                        back_btn=back_btn,
-                        user_data=user_data,
-                        *args,
-                        **kwargs_copy
-                    )
+        element_specs = []
+        snapshot = None
+        if self.snapshot_lists:
+            # Одна запись на страницу: общие аргументы и элементы, кнопки ссылаются на элемент по номеру
+            snapshot = self._build_callback_data(button_func, back_btn, args, kwargs)
+            snapshot['elements'] = [self._to_storable(obj) for obj in current_objects]
+            element_specs = [(text_func(obj), (SNAPSHOT_PREFIX, index)) for index, obj in enumerate(current_objects)]
+        else:
+            for obj in current_objects:
+                kwargs_copy = kwargs.copy()
+                kwargs_copy['element'] = obj
+                element_specs.append(
+                    (text_func(obj), self._build_callback_data(button_func, back_btn, args, kwargs_copy))
                 )
-            )
 
-        buttons = await asyncio.gather(*tasks)
-        for btn in buttons:
+        paginate_specs = self._paginate_specs(
+            func=display_func,
+            total_pages=ceil(total / objects_per_page),
+            current_page=page,
+            back_btn=back_btn,
+            args=args,
+            kwargs=kwargs
+        )
+
+        shared = snapshot
+        if self.parametric_pagination:
+            context = self._page_context(display_func, back_btn, args, kwargs)
+            if snapshot is not None:
+                # Снимок страницы хранит и контекст навигации: одна запись на всю клавиатуру
+                snapshot['pages'] = context
+            else:
+                shared = context
+
+        # Элементы и пагинация страницы сохраняются одной транзакцией
+        buttons = await self._render_buttons(element_specs + paginate_specs, user_data, button_ttl, shared)
+        for btn in buttons[:len(element_specs)]:
             elem = [btn] if not row else btn
             keyboards.append(elem)
 
-        keyboards.append(await pagination_buttons)
+        keyboards.append(buttons[len(element_specs):])
         return keyboards
 
-    async def create_paginate_buttons(
+    def _paginate_specs(
             self,
-            *args,
             func: Callable,
             total_pages: int,
             current_page: int,
-            user_data: Union[int, types.Message | types.CallbackQuery],
-            back_btn: Optional[str] = None,
-            max_buttons=5,
-            **kwargs
-    ) -> List[InlineKeyboardButton]:
-        buttons = []
+            back_btn: Optional[str],
+            args: tuple,
+            kwargs: Dict[str, Any],
+            max_buttons=5
+    ) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        specs = []
 
         # Определяем диапазон страниц для отображения
         max_buttons = min(max_buttons, total_pages)
@@ -306,20 +729,48 @@ class AsyncCallbackManager:
         for page in range(start_page, end_page + 1):
             if page == current_page:
                 # Текущая страница
-                buttons.append(InlineKeyboardButton(text=f"•{page}•", callback_data="noop"))
+                specs.append((f"•{page}•", None))
+            elif self.parametric_pagination:
+                specs.append((str(page), (PAGE_PREFIX, page)))
             else:
-                kwargs_copy = kwargs.copy()
-                kwargs_copy['page'] = page
-                if back_btn is not None:
-                    kwargs_copy['back_btn'] = back_btn  # Передаём back_btn в kwargs
-
-                page_button = await self.create_button(
-                    text=str(page),
-                    func=func,
-                    user_data=user_data,
-                    *args,
-                    **kwargs_copy
-                )
-                buttons.append(page_button)
+                context = self._page_context(func, back_btn, args, kwargs)
+                context['kwargs']['page'] = page
+                specs.append((str(page), context))
 
-        return buttons
+        return specs
+
+    def _page_context(
+            self,
+            func: Callable,
+            back_btn: Optional[str],
+            args: tuple,
+            kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        # back_btn сохраняется как callback_data, обработчик страницы получает готовую кнопку "Назад".
+        # Сам объект (например, CallbackQuery) в данные не попадает: иначе каждая страница тянула бы за собой
+        # сериализованные предыдущие запросы
+        return self._build_callback_data(func, back_btn, args, kwargs.copy())
+
+    async def create_paginate_buttons(
+            self,
+            *args,
+            func: Callable,
+            total_pages: int,
+            current_page: int,
+            user_data: Union[int, types.Message | types.CallbackQuery],
+            back_btn: Optional[str] = None,
+            max_buttons=5,
+            button_ttl: Optional[float] = None,
+            **kwargs
+    ) -> List[InlineKeyboardButton]:
+        specs = self._paginate_specs(
+            func=func,
+            total_pages=total_pages,
+            current_page=current_page,
+            back_btn=back_btn,
+            args=args,
+            kwargs=kwargs,
+            max_buttons=max_buttons
+        )
+        shared = self._page_context(func, back_btn, args, kwargs) if self.parametric_pagination else None
+        return await self._render_buttons(specs, user_data, button_ttl, shared)
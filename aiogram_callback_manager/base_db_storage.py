@@ -1,70 +1,647 @@
 import asyncio
+import base64
+import pathlib
+import re
 import time
-from typing import Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
 
 import aiosqlite
 from aiosqlite import Connection
 
+from .metrics import MetricsRegistry, NULL_METRICS
+
+# Размер короткого дайджеста BLAKE2 в байтах; в callback_data он занимает 16 символов base64url
+COMPACT_DIGEST_SIZE = 12
+_COMPACT_HASH = re.compile(r"[A-Za-z0-9_-]{16}")
+_HEX_HASH = re.compile(r"[0-9a-f]{32}")
+
+# Таблицы схем: v1 — ключ hex строкой в обычных таблицах, v2 — двоичный ключ и WITHOUT ROWID
+_TABLES = {
+    1: ("callback_payload", "callback_access"),
+    2: ("callback_payload_v2", "callback_access_v2"),
+}
+
+
+def _hash_to_key(data_hash: str) -> bytes:
+    # md5 в hex занимает 16 байт, короткий хэш base64url — 12, остальные строки хранятся как есть
+    if _HEX_HASH.fullmatch(data_hash):
+        return bytes.fromhex(data_hash)
+    if _COMPACT_HASH.fullmatch(data_hash):
+        return base64.urlsafe_b64decode(data_hash)
+    return data_hash.encode()
+
+
+def _key_to_hash(key: bytes) -> str:
+    if len(key) == 16:
+        return key.hex()
+    if len(key) == COMPACT_DIGEST_SIZE:
+        return base64.urlsafe_b64encode(key).decode()
+    return key.decode()
+
+
+class CallbackRecord(NamedTuple):
+    data_hash: str
+    data_bytes: bytes
+    timestamp: float
+    user_id: int
+    expires_at: Optional[float] = None
+
 
 class CallbackDataStorage:
-    async def save(self, data_hash: str, data_bytes: bytes, timestamp: float, user_id: int):
+    # Менеджер подставляет сюда свой реестр метрик
+    metrics: MetricsRegistry = NULL_METRICS
+
+    async def save(
+            self,
+            data_hash: str,
+            data_bytes: bytes,
+            timestamp: float,
+            user_id: int,
+            expires_at: Optional[float] = None
+    ):
         raise NotImplementedError
 
+    async def save_many(self, records: List[CallbackRecord]):
+        # Реализация по умолчанию: по одной записи за раз.
+        # expires_at передается только если задан: хранилища, написанные до его появления, принимают 4 аргумента
+        for record in records:
+            if record.expires_at is None:
+                await self.save(record.data_hash, record.data_bytes, record.timestamp, record.user_id)
+            else:
+                await self.save(record.data_hash, record.data_bytes, record.timestamp, record.user_id,
+                                expires_at=record.expires_at)
+
     async def load(self, data_hash: str, user_id: int) -> Optional[bytes]:
         raise NotImplementedError
 
     async def clean_old(self, expiry_time: int):
         raise NotImplementedError
 
+    async def delete_many(self, keys: List[Tuple[str, int]]) -> int:
+        """
+              Удаляет записи по ключам (hash, user_id) и возвращает количество удаленных.
+        """
+        raise NotImplementedError
+
+    async def user_entries(self, user_id: int) -> List[Tuple[str, int, float, Optional[float]]]:
+        """
+              Записи пользователя от старых к новым: (hash, размер данных, created_at, expires_at).
+              Пустой список, если хранилище не умеет их перечислять.
+        """
+        return []
+
     async def init_db(self):
         raise NotImplementedError
 
+    async def close(self):
+        pass
+
+    async def stats(self) -> Dict[str, Any]:
+        """
+              Размер хранилища: rows — количество записей, size_bytes — занимаемое место (если известно).
+        """
+        return {}
+
 
 class SQLiteStorage(CallbackDataStorage):
-    def __init__(self, db_path: str):
+    def __init__(
+            self,
+            db_path: str,
+            group_commit: bool = False,
+            commit_delay: float = 0.005,
+            commit_max_rows: int = 500,
+            journal_mode: Optional[str] = None,
+            read_connections: int = 0,
+            synchronous: Optional[str] = None,
+            cache_size: Optional[int] = None,
+            mmap_size: Optional[int] = None,
+            clean_batch_size: Optional[int] = None,
+            clean_pause: float = 0,
+            user_index: bool = False,
+            known_entries: int = 0,
+            known_refresh: float = 60,
+            schema: int = 1
+    ):
+        """
+              SQLite хранилище callback данных.
+
+              :param db_path: Путь к файлу базы данных.
+              :param group_commit: Копить записи конкурентных корутин и сохранять их одной транзакцией.
+              :param commit_delay: Максимальная задержка записи в режиме group_commit (в секундах).
+              :param commit_max_rows: Количество накопленных записей, при котором запись начинается сразу.
+              :param journal_mode: Режим журнала SQLite, например "WAL".
+              :param read_connections: Размер пула соединений только для чтения (load не ждет записи).
+              :param synchronous: Значение PRAGMA synchronous, например "NORMAL".
+              :param cache_size: Значение PRAGMA cache_size.
+              :param mmap_size: Значение PRAGMA mmap_size в байтах.
+              :param clean_batch_size: Удалять устаревшие записи порциями такого размера.
+              :param clean_pause: Пауза между порциями удаления (в секундах).
+              :param user_index: Создать индекс по user_id для быстрого user_entries (нужен для квот).
+              :param known_entries: Сколько недавно записанных ключей помнить; повторное сохранение тех же
+                                    данных тем же пользователем не пишет в базу. 0 — выключено.
+              :param known_refresh: Через сколько секунд повторное сохранение все же обновит запись в базе
+                                    (продлевает ее жизнь для clean_old).
+              :param schema: 2 — компактная схема: двоичные ключи и таблица доступа WITHOUT ROWID.
+                             Данные схемы 1 переносятся в фоне, пока хранилище работает.
+        """
+        if schema not in _TABLES:
+            raise ValueError(f"Unknown schema {schema}")
         self.db_path = db_path
         self._db_lock = asyncio.Lock()
         self.connection: Optional[Connection] = None
 
-    async def clean_old(self, expiry_time: int):
-        current_time = time.time()
+        self.group_commit = group_commit
+        self.commit_delay = commit_delay
+        self.commit_max_rows = commit_max_rows
+        # Записи, ожидающие commit, и пачки, отправленные на запись, но еще не закоммиченные;
+        # ключ — (hash, user_id). Пачка попадает в _flushing сразу, а не после получения блокировки:
+        # иначе, пока она ждет предыдущий commit, load не нашел бы ее ни в одном из словарей
+        self._pending: Dict[Tuple[str, int], CallbackRecord] = {}
+        self._flushing: List[Dict[Tuple[str, int], CallbackRecord]] = []
+        self._pending_future: Optional[asyncio.Future] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+        self.journal_mode = journal_mode
+        self.read_connections = read_connections
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self._readers: Optional[asyncio.Queue] = None
+        self._reader_connections: List[Connection] = []
+
+        self.clean_batch_size = clean_batch_size
+        self.clean_pause = clean_pause
+        self.user_index = user_index
+
+        self.known_entries = known_entries
+        self.known_refresh = known_refresh
+        # (hash, user_id) -> (created_at, expires_at) последней записи в базу; от давних к недавним
+        self._known: "OrderedDict[Tuple[str, int], Tuple[float, Optional[float]]]" = OrderedDict()
+
+        self.schema = schema
+        self._payload_table, self._access_table = _TABLES[schema]
+        self._key = _hash_to_key if schema == 2 else str
+        self._from_key = _key_to_hash if schema == 2 else str
+        # Таблицы схемы 1, которые еще переносятся в схему 2; пока они есть, load ищет и в них
+        self._legacy = False
+        self._migration_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @asynccontextmanager
+    async def _locked(self):
+        started = time.perf_counter()
         async with self._db_lock:
-            await self.connection.execute(
-                "DELETE FROM callback_data WHERE ? - created_at > ?",
-                (current_time, expiry_time)
+            self.metrics.observe("lock_wait_seconds", time.perf_counter() - started)
+            yield
+
+    def _is_known(self, record: CallbackRecord) -> bool:
+        key = (record.data_hash, record.user_id)
+        known = self._known.get(key)
+        if known is None:
+            return False
+        created_at, expires_at = known
+        if record.timestamp - created_at >= self.known_refresh:
+            return False
+        if (expires_at is None) != (record.expires_at is None):
+            return False
+        # Истекшую строку load уже не вернет, поэтому кнопку, показанную снова, нужно записать заново
+        if expires_at is not None and expires_at <= record.timestamp:
+            return False
+        if expires_at is not None and expires_at < record.expires_at - self.known_refresh:
+            return False
+        self._known.move_to_end(key)
+        return True
+
+    def _remember(self, records: List[CallbackRecord]):
+        for record in records:
+            key = (record.data_hash, record.user_id)
+            self._known[key] = (record.timestamp, record.expires_at)
+            self._known.move_to_end(key)
+        while len(self._known) > self.known_entries:
+            self._known.popitem(last=False)
+
+    async def clean_old(self, expiry_time: int) -> int:
+        current_time = time.time()
+        tables = [(self._payload_table, self._access_table)]
+        if self._legacy:
+            # Записи, еще не перенесенные из схемы 1, тоже устаревают: load находит их в старых таблицах.
+            # Старые таблицы очищаются первыми: перенесенное за это время удалится из новых
+            tables.insert(0, _TABLES[1])
+
+        deleted = 0
+        for payload_table, access_table in tables:
+            # Записи с собственным сроком жизни и записи без него удаляются по своим индексам
+            deleted += await self._delete_where(payload_table, access_table, "expires_at <= ?", (current_time,))
+            deleted += await self._delete_where(
+                payload_table, access_table,
+                "expires_at IS NULL AND created_at < ?",
+                (current_time - expiry_time,)
             )
+        # Запомненные ключи могли быть удалены, следующее сохранение запишет их заново
+        self._known.clear()
+        return deleted
+
+    async def _delete_where(self, payload_table: str, access_table: str, condition: str, params: tuple) -> int:
+        # LIMIT -1 в SQLite означает отсутствие ограничения
+        batch_size = self.clean_batch_size or -1
+
+        # Удаление порциями: между ними блокировка отпускается для остальных запросов
+        deleted = 0
+        while True:
+            async with self._locked():
+                if access_table != self._access_table and not self._legacy:
+                    # Перенос из схемы 1 закончился между порциями, старых таблиц больше нет
+                    return deleted
+                count = await self._delete_batch(payload_table, access_table, condition, params, batch_size)
+                await self.connection.commit()
+            deleted += count
+            if batch_size < 0 or count < batch_size:
+                return deleted
+            await asyncio.sleep(self.clean_pause)
+
+    async def _delete_batch(
+            self,
+            payload_table: str,
+            access_table: str,
+            condition: str,
+            params: tuple,
+            batch_size: int
+    ) -> int:
+        await self._mark(f"SELECT hash, user_id FROM {access_table} WHERE {condition} LIMIT ?", (*params, batch_size))
+        return await self._delete_marked(payload_table, access_table)
+
+    async def _mark(self, select: str, params: tuple):
+        await self.connection.execute("DELETE FROM temp.expired_access")
+        await self.connection.execute(f"INSERT INTO temp.expired_access (hash, user_id) {select}", params)
+
+    async def _delete_marked(self, payload_table: str, access_table: str) -> int:
+        # Удаляет записи, ключи которых собраны во временной таблице expired_access
+        cursor = await self.connection.execute(
+            f"DELETE FROM {access_table} WHERE (hash, user_id) IN "
+            f"(SELECT hash, user_id FROM temp.expired_access)"
+        )
+        # Данные удаляются, только когда на них не осталось ссылок
+        await self.connection.execute(f"""
+            DELETE FROM {payload_table}
+            WHERE hash IN (SELECT hash FROM temp.expired_access)
+              AND NOT EXISTS (SELECT 1 FROM {access_table} a WHERE a.hash = {payload_table}.hash)
+        """)
+        return cursor.rowcount
+
+    async def delete_many(self, keys: List[Tuple[str, int]]) -> int:
+        if not keys:
+            return 0
+        # Еще не записанные в базу записи просто отбрасываются
+        for key in keys:
+            self._pending.pop(key, None)
+
+        tables = [(self._payload_table, self._access_table, self._key)]
+        if self._legacy:
+            # Записи, еще не перенесенные из схемы 1
+            tables.append((*_TABLES[1], str))
+
+        deleted = 0
+        async with self._locked():
+            for payload_table, access_table, to_key in tables:
+                await self.connection.execute("DELETE FROM temp.expired_access")
+                await self.connection.executemany(
+                    "INSERT INTO temp.expired_access (hash, user_id) VALUES (?, ?)",
+                    [(to_key(data_hash), user_id) for data_hash, user_id in keys]
+                )
+                deleted += await self._delete_marked(payload_table, access_table)
             await self.connection.commit()
+            for key in keys:
+                self._known.pop(key, None)
+        return deleted
+
+    async def user_entries(self, user_id: int) -> List[Tuple[str, int, float, Optional[float]]]:
+        await self.flush()
+        tables = [(self._payload_table, self._access_table, self._from_key)]
+        if self._legacy:
+            tables.append((*_TABLES[1], str))
+
+        entries = []
+        async with self._locked():
+            for payload_table, access_table, from_key in tables:
+                async with self.connection.execute(
+                        f"SELECT a.hash, length(p.data), a.created_at, a.expires_at "
+                        f"FROM {access_table} a JOIN {payload_table} p ON p.hash = a.hash "
+                        f"WHERE a.user_id = ?",
+                        (user_id,)
+                ) as cursor:
+                    entries += [(from_key(row[0]), *row[1:]) for row in await cursor.fetchall()]
+        return sorted(entries, key=lambda entry: entry[2])
+
+    async def _apply_pragmas(self, connection: Connection):
+        if self.cache_size is not None:
+            await connection.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        if self.mmap_size is not None:
+            await connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
 
     async def init_db(self):
+        self._closing = False
         self.connection = await aiosqlite.connect(self.db_path)
+        if self.journal_mode is not None:
+            await self.connection.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        if self.synchronous is not None:
+            await self.connection.execute(f"PRAGMA synchronous = {self.synchronous}")
+        await self._apply_pragmas(self.connection)
+        await self.connection.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS expired_access (hash TEXT, user_id BIG_INTEGER)"
+        )
+        if self.schema == 1 or await self._table_exists("callback_data"):
+            await self._create_v1_tables()
+        if self.schema == 2:
+            await self._create_v2_tables()
+        if self.user_index:
+            await self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self._access_table}_user ON {self._access_table} (user_id, created_at)"
+            )
+        await self._migrate()
+        await self.connection.commit()
+
+        if self.schema == 2 and await self._table_exists("callback_access"):
+            # Перенос из схемы 1 идет порциями в фоне, до его окончания load ищет и в старых таблицах
+            self._legacy = True
+            await self.connection.create_function("callback_key", 1, _hash_to_key)
+            self._migration_task = asyncio.get_running_loop().create_task(self._migrate_v2())
+
+        if self.read_connections > 0 and self.db_path != ':memory:':
+            await self._open_readers()
+
+    async def _table_exists(self, name: str) -> bool:
+        async with self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ) as cursor:
+            return await cursor.fetchone() is not None
+
+    async def _create_v1_tables(self):
+        # Каждые уникальные данные хранятся один раз, пользователи ссылаются на них через callback_access
         await self.connection.execute("""
-            CREATE TABLE IF NOT EXISTS callback_data (
+            CREATE TABLE IF NOT EXISTS callback_payload (
                 hash TEXT PRIMARY KEY,
-                data BLOB,
+                data BLOB
+            )
+        """)
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS callback_access (
+                hash TEXT,
+                user_id BIG_INTEGER,
                 created_at REAL,
-                user_id BIG_INTEGER
+                expires_at REAL,
+                PRIMARY KEY (hash, user_id)
             )
         """)
-        await self.connection.commit()
+        # Один индекс обслуживает и удаление по expires_at, и по created_at для записей без срока жизни
+        await self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS callback_access_expiry ON callback_access (expires_at, created_at)"
+        )
 
-    async def save(self, data_id: str, data_bytes: bytes, timestamp: float, user_id: int):
-        async with self._db_lock:
-            await self.connection.execute(
-                "INSERT OR REPLACE INTO callback_data (hash, data, created_at, user_id) VALUES (?, ?, ?, ?)",
-                (data_id, data_bytes, timestamp, user_id)
+    async def _create_v2_tables(self):
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS callback_payload_v2 (
+                hash BLOB PRIMARY KEY,
+                data BLOB
             )
-            await self.connection.commit()
+        """)
+        # Строки доступа маленькие, поэтому таблица хранится прямо в B-дереве первичного ключа:
+        # проверка хэша и пользователя — один поиск без перехода по rowid.
+        # Данные остаются в обычной таблице: большие строки в WITHOUT ROWID хранятся хуже.
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS callback_access_v2 (
+                hash BLOB,
+                user_id INTEGER,
+                created_at REAL,
+                expires_at REAL,
+                PRIMARY KEY (hash, user_id)
+            ) WITHOUT ROWID
+        """)
+        await self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS callback_access_v2_expiry ON callback_access_v2 (expires_at, created_at)"
+        )
+
+    async def _migrate_v2(self):
+        batch_size = self.clean_batch_size or 5000
+        while not self._closing:
+            async with self._locked():
+                await self._mark("SELECT hash, user_id FROM callback_access LIMIT ?", (batch_size,))
+                await self.connection.execute("""
+                    INSERT OR IGNORE INTO callback_payload_v2 (hash, data)
+                    SELECT callback_key(hash), data FROM callback_payload
+                    WHERE hash IN (SELECT hash FROM temp.expired_access)
+                """)
+                # Записи, сохраненные заново уже в схеме 2, новее перенесенных
+                await self.connection.execute("""
+                    INSERT OR IGNORE INTO callback_access_v2 (hash, user_id, created_at, expires_at)
+                    SELECT callback_key(hash), user_id, created_at, expires_at FROM callback_access
+                    WHERE (hash, user_id) IN (SELECT hash, user_id FROM temp.expired_access)
+                """)
+                count = await self._delete_marked(*_TABLES[1])
+                if count < batch_size:
+                    await self.connection.execute("DROP TABLE callback_access")
+                    await self.connection.execute("DROP TABLE callback_payload")
+                    self._legacy = False
+                await self.connection.commit()
+            if not self._legacy:
+                return
+            await asyncio.sleep(self.clean_pause)
+
+    async def _migrate(self):
+        # Перенос данных из старой таблицы callback_data (одна строка на каждую пару данные/пользователь);
+        # для схемы 2 она сначала переносится в таблицы схемы 1
+        async with self.connection.execute("PRAGMA table_info(callback_data)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        if not columns:
+            return
+
+        expires_at = "expires_at" if 'expires_at' in columns else "NULL"
+        await self.connection.execute(
+            "INSERT OR IGNORE INTO callback_payload (hash, data) SELECT hash, data FROM callback_data"
+        )
+        await self.connection.execute(
+            f"INSERT OR REPLACE INTO callback_access (hash, user_id, created_at, expires_at) "
+            f"SELECT hash, user_id, created_at, {expires_at} FROM callback_data"
+        )
+        await self.connection.execute("DROP TABLE callback_data")
+
+    async def _open_readers(self):
+        # Соединения только для чтения; в режиме WAL они не блокируются писателем
+        uri = pathlib.Path(self.db_path).absolute().as_uri() + "?mode=ro"
+        self._readers = asyncio.Queue()
+        for _ in range(self.read_connections):
+            reader = await aiosqlite.connect(uri, uri=True)
+            await reader.execute("PRAGMA query_only = 1")
+            await self._apply_pragmas(reader)
+            self._reader_connections.append(reader)
+            self._readers.put_nowait(reader)
+
+    async def save(
+            self,
+            data_id: str,
+            data_bytes: bytes,
+            timestamp: float,
+            user_id: int,
+            expires_at: Optional[float] = None
+    ):
+        await self.save_many([CallbackRecord(data_id, data_bytes, timestamp, user_id, expires_at)])
+
+    async def save_many(self, records: List[CallbackRecord]):
+        if self.known_entries:
+            # Те же данные недавно уже записаны в базу: одинаковые меню не переписываются при каждом показе
+            fresh = [record for record in records if not self._is_known(record)]
+            if len(fresh) < len(records):
+                self.metrics.inc("skipped_writes_total", len(records) - len(fresh))
+            records = fresh
+        if not records:
+            return
+        if self.group_commit:
+            await self._enqueue(records)
+            return
+
+        # Все записи пишутся одной транзакцией с одним commit
+        async with self._locked():
+            await self._write(records)
+
+    async def _write(self, records: List[CallbackRecord]):
+        await self.connection.executemany(
+            f"INSERT OR IGNORE INTO {self._payload_table} (hash, data) VALUES (?, ?)",
+            {record.data_hash: (self._key(record.data_hash), record.data_bytes) for record in records}.values()
+        )
+        await self.connection.executemany(
+            f"INSERT OR REPLACE INTO {self._access_table} (hash, user_id, created_at, expires_at) "
+            f"VALUES (?, ?, ?, ?)",
+            [(self._key(record.data_hash), record.user_id, record.timestamp, record.expires_at) for record in records]
+        )
+        await self.connection.commit()
+        if self.known_entries:
+            self._remember(records)
+
+    async def _enqueue(self, records: List[CallbackRecord]):
+        loop = asyncio.get_running_loop()
+        for record in records:
+            self._pending[(record.data_hash, record.user_id)] = record
+
+        if self._pending_future is None:
+            self._pending_future = loop.create_future()
+            self._flush_handle = loop.call_later(self.commit_delay, self._start_flush)
+
+        future = self._pending_future
+        if len(self._pending) >= self.commit_max_rows:
+            self._start_flush()
+
+        # shield: отмена одного ожидающего не должна отменять запись остальных
+        await asyncio.shield(future)
+
+    def _start_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending_future is None:
+            return
+
+        batch, future = self._pending, self._pending_future
+        self._pending, self._pending_future = {}, None
+        self._flushing.append(batch)
+
+        task = asyncio.get_running_loop().create_task(self._flush(batch, future))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self, batch: Dict[Tuple[str, int], CallbackRecord], future: asyncio.Future):
+        try:
+            async with self._locked():
+                await self._write(list(batch.values()))
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(None)
+        finally:
+            self._flushing.remove(batch)
+
+    async def flush(self):
+        """
+              Немедленно записывает в базу все накопленные в режиме group_commit записи.
+        """
+        self._start_flush()
+        while self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
 
     async def load(self, data_id: str, user_id: int) -> Optional[bytes]:
-        async with self._db_lock:
-            async with self.connection.execute(
-                    "SELECT data FROM callback_data WHERE hash = ? AND user_id = ?",
-                    (data_id, user_id)
-            ) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    return row[0]
+        # Записи, еще не попавшие в базу, видны сразу
+        key = (data_id, user_id)
+        record = self._pending.get(key)
+        if record is None:
+            # Более поздние пачки содержат более свежие данные
+            for batch in reversed(self._flushing):
+                record = batch.get(key)
+                if record is not None:
+                    break
+        if record is not None:
+            return record.data_bytes
+
+        if self._readers is not None:
+            reader = await self._readers.get()
+            try:
+                return await self._select(reader, data_id, user_id)
+            finally:
+                self._readers.put_nowait(reader)
+
+        async with self._locked():
+            return await self._select(self.connection, data_id, user_id)
+
+    async def _select(self, connection: Connection, data_id: str, user_id: int) -> Optional[bytes]:
+        data_bytes = await self._select_from(
+            connection, self._payload_table, self._access_table, self._key(data_id), user_id
+        )
+        if data_bytes is None and self._legacy:
+            try:
+                data_bytes = await self._select_from(connection, *_TABLES[1], data_id, user_id)
+            except aiosqlite.OperationalError:
+                # Перенос закончился и старые таблицы удалены, пока шел запрос
+                return None
+        return data_bytes
+
+    @staticmethod
+    async def _select_from(
+            connection: Connection,
+            payload_table: str,
+            access_table: str,
+            key: Any,
+            user_id: int
+    ) -> Optional[bytes]:
+        async with connection.execute(
+                f"SELECT p.data FROM {access_table} a JOIN {payload_table} p ON p.hash = a.hash "
+                f"WHERE a.hash = ? AND a.user_id = ? AND (a.expires_at IS NULL OR a.expires_at > ?)",
+                (key, user_id, time.time())
+        ) as cursor:
+            row = await cursor.fetchone()
+            if row:
+                return row[0]
         return None
 
+    async def stats(self) -> Dict[str, Any]:
+        async with self.connection.execute(f"SELECT COUNT(*) FROM {self._access_table}") as cursor:
+            rows = (await cursor.fetchone())[0]
+        async with self.connection.execute(f"SELECT COUNT(*) FROM {self._payload_table}") as cursor:
+            payloads = (await cursor.fetchone())[0]
+        async with self.connection.execute("PRAGMA page_count") as cursor:
+            page_count = (await cursor.fetchone())[0]
+        async with self.connection.execute("PRAGMA page_size") as cursor:
+            page_size = (await cursor.fetchone())[0]
+        return {'rows': rows, 'payloads': payloads, 'size_bytes': page_count * page_size}
+
     async def close(self):
+        if self._migration_task is not None:
+            # Текущая порция переноса дописывается, остальное продолжится со следующего init_db
+            self._closing = True
+            await self._migration_task
+            self._migration_task = None
+        await self.flush()
+        for reader in self._reader_connections:
+            await reader.close()
+        self._reader_connections.clear()
+        self._readers = None
         await self.connection.close()
@@ -0,0 +1,142 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .base_db_storage import CallbackDataStorage, CallbackRecord
+from .metrics import MetricsRegistry
+from .memory_storage import _PayloadPool
+
+
+class CachedStorage(CallbackDataStorage):
+    def __init__(self, storage: CallbackDataStorage, max_size: int = 10000, ttl: Optional[float] = 3600):
+        """
+              LRU кэш в памяти поверх любого хранилища callback данных.
+
+              :param storage: Хранилище, к которому обращаемся при промахе.
+              :param max_size: Максимальное количество записей в кэше.
+              :param ttl: Время жизни записи в секундах (обычно равно expiry_time менеджера).
+        """
+        self.storage = storage
+        self.max_size = max_size
+        self.ttl = ttl
+        # (hash, user_id) -> (data, created_at, cached_at, expires_at);
+        # created_at неизвестен для записей, прочитанных из хранилища
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[bytes, Optional[float], float, Optional[float]]]" = \
+            OrderedDict()
+        # Одинаковые данные разных пользователей занимают память один раз
+        self._payloads = _PayloadPool()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        return self.storage.metrics
+
+    @metrics.setter
+    def metrics(self, metrics: MetricsRegistry):
+        self.storage.metrics = metrics
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _put(
+            self,
+            key: Tuple[str, int],
+            data_bytes: bytes,
+            created_at: Optional[float],
+            expires_at: Optional[float] = None
+    ):
+        if key in self._cache:
+            self._remove(key)
+        data_bytes = self._payloads.retain(key[0], data_bytes)
+        self._cache[key] = (data_bytes, created_at, time.time(), expires_at)
+        while len(self._cache) > self.max_size:
+            self._remove(next(iter(self._cache)))
+
+    def _remove(self, key: Tuple[str, int]):
+        del self._cache[key]
+        self._payloads.release(key[0])
+
+    def invalidate(self, data_hash: Optional[str] = None, user_id: Optional[int] = None):
+        """
+              Удаляет запись из кэша, а без аргументов очищает кэш целиком.
+        """
+        if data_hash is None:
+            self._cache.clear()
+            self._payloads.clear()
+        elif (data_hash, user_id) in self._cache:
+            self._remove((data_hash, user_id))
+
+    async def init_db(self):
+        await self.storage.init_db()
+
+    async def close(self):
+        await self.storage.close()
+
+    async def stats(self) -> Dict[str, Any]:
+        stats = dict(await self.storage.stats())
+        stats.update(cache_entries=len(self._cache), cache_hits=self.hits, cache_misses=self.misses)
+        return stats
+
+    async def save(
+            self,
+            data_hash: str,
+            data_bytes: bytes,
+            timestamp: float,
+            user_id: int,
+            expires_at: Optional[float] = None
+    ):
+        if expires_at is None:
+            await self.storage.save(data_hash, data_bytes, timestamp, user_id)
+        else:
+            await self.storage.save(data_hash, data_bytes, timestamp, user_id, expires_at=expires_at)
+        self._put((data_hash, user_id), data_bytes, timestamp, expires_at)
+
+    async def save_many(self, records: List[CallbackRecord]):
+        await self.storage.save_many(records)
+        for record in records:
+            self._put((record.data_hash, record.user_id), record.data_bytes, record.timestamp, record.expires_at)
+
+    async def load(self, data_hash: str, user_id: int) -> Optional[bytes]:
+        key = (data_hash, user_id)
+        entry = self._cache.get(key)
+        if entry is not None:
+            data_bytes, created_at, cached_at, expires_at = entry
+            current_time = time.time()
+            if (
+                    (self.ttl is None or current_time - (created_at or cached_at) <= self.ttl)
+                    and (expires_at is None or current_time < expires_at)
+            ):
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return data_bytes
+            self._remove(key)
+
+        self.misses += 1
+        data_bytes = await self.storage.load(data_hash, user_id)
+        if data_bytes is not None:
+            self._put(key, data_bytes, None)
+        return data_bytes
+
+    async def delete_many(self, keys: List[Tuple[str, int]]) -> int:
+        for data_hash, user_id in keys:
+            self.invalidate(data_hash, user_id)
+        return await self.storage.delete_many(keys)
+
+    async def user_entries(self, user_id: int) -> List[Tuple[str, int, float, Optional[float]]]:
+        return await self.storage.user_entries(user_id)
+
+    async def clean_old(self, expiry_time: int):
+        deleted = await self.storage.clean_old(expiry_time)
+
+        # Для записей с неизвестным временем создания нельзя сказать, удалило ли их хранилище
+        current_time = time.time()
+        border = current_time - expiry_time
+        for key in [
+            key for key, (_, created_at, _, expires_at) in self._cache.items()
+            if created_at is None or (expires_at <= current_time if expires_at is not None else created_at < border)
+        ]:
+            self._remove(key)
+        return deleted
@@ -1,5 +1,6 @@
+import inspect
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Optional, Tuple
 
 from aiogram.dispatcher.event.handler import HandlerObject
 
@@ -7,3 +8,14 @@ from aiogram.dispatcher.event.handler import HandlerObject
 @dataclass
 class _HandlerObject(HandlerObject):
     custom_kwargs: Optional[dict] = field(default_factory=dict)
+    handler_id: str = ""
+    # План вызова считается один раз при регистрации, а не при каждом нажатии
+    param_names: Tuple[str, ...] = field(init=False)
+    accepts_back_btn: bool = field(init=False)
+    inline_id: Optional[bytes] = field(init=False, default=None)
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        parameters = inspect.signature(inspect.unwrap(self.callback)).parameters
+        self.param_names = tuple(parameters)
+        self.accepts_back_btn = 'back_btn' in parameters
@@ -0,0 +1,156 @@
+import base64
+import hashlib
+import hmac
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+INLINE_PREFIX = "ci_"
+# Ограничение Telegram на длину callback_data в байтах
+MAX_CALLBACK_DATA_LENGTH = 64
+# Индекс "параметра" для данных кнопки "Назад"
+BACK_BTN_INDEX = 0xFF
+# Длина метки, привязывающей inline callback_data к пользователю (байт)
+USER_TAG_SIZE = 4
+
+_NONE, _TRUE, _FALSE, _INT, _STR = range(5)
+
+
+def write_varint(buffer: bytearray, value: int):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            buffer.append(byte | 0x80)
+        else:
+            buffer.append(byte)
+            return
+
+
+def read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_value(buffer: bytearray, value: Any) -> bool:
+    """
+          Кодирует простое значение (None, bool, int, str); возвращает False для остальных типов.
+    """
+    if value is None:
+        buffer.append(_NONE)
+    elif value is True:
+        buffer.append(_TRUE)
+    elif value is False:
+        buffer.append(_FALSE)
+    elif type(value) is int:
+        buffer.append(_INT)
+        # zigzag: отрицательные числа тоже кодируются коротко
+        write_varint(buffer, value * 2 if value >= 0 else -value * 2 - 1)
+    elif type(value) is str:
+        raw = value.encode()
+        buffer.append(_STR)
+        write_varint(buffer, len(raw))
+        buffer += raw
+    else:
+        return False
+    return True
+
+
+def decode_value(data: bytes, pos: int) -> Tuple[Any, int]:
+    tag = data[pos]
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _INT:
+        value, pos = read_varint(data, pos)
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+    if tag == _STR:
+        length, pos = read_varint(data, pos)
+        end = pos + length
+        if end > len(data):
+            raise ValueError("Truncated inline data")
+        return data[pos:end].decode(), end
+    raise ValueError(f"Unknown inline value tag {tag}")
+
+
+def user_tag(data: bytes, user_id: int, key: Optional[bytes] = None) -> bytes:
+    """
+          Метка данных кнопки для пользователя: кнопку, созданную для одного пользователя, не нажать другому.
+          С ключом метка работает как MAC, и подделать данные кнопки нельзя.
+    """
+    return hashlib.blake2b(
+        data + user_id.to_bytes(8, "big", signed=True), digest_size=USER_TAG_SIZE, key=key or b""
+    ).digest()
+
+
+def encode_inline(
+        short_id: bytes,
+        args: Sequence[Any],
+        kwargs: Dict[int, Any],
+        user_id: int,
+        key: Optional[bytes] = None
+) -> Optional[str]:
+    """
+          Упаковывает вызов обработчика прямо в callback_data.
+
+          :param short_id: Короткий идентификатор обработчика.
+          :param args: Позиционные аргументы.
+          :param kwargs: Именованные аргументы по индексу параметра обработчика.
+          :param user_id: Пользователь, которому принадлежит кнопка.
+          :param key: Ключ метки пользователя.
+          :return: callback_data или None, если данные не помещаются или типы не поддерживаются.
+    """
+    buffer = bytearray()
+    write_varint(buffer, len(args))
+    for value in args:
+        if not encode_value(buffer, value):
+            return None
+    for index, value in kwargs.items():
+        buffer.append(index)
+        if not encode_value(buffer, value):
+            return None
+
+    data = short_id + user_tag(short_id + buffer, user_id, key) + buffer
+    callback_data = INLINE_PREFIX + base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+    if len(callback_data) > MAX_CALLBACK_DATA_LENGTH:
+        return None
+    return callback_data
+
+
+def decode_inline(
+        callback_data: str,
+        short_id_size: int,
+        user_id: int,
+        key: Optional[bytes] = None
+) -> Tuple[bytes, List[Any], Dict[int, Any]]:
+    """
+          Распаковывает callback_data; ValueError, если кнопка создана для другого пользователя или повреждена.
+    """
+    payload = callback_data[len(INLINE_PREFIX):]
+    data = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+
+    short_id = data[:short_id_size]
+    body_start = short_id_size + USER_TAG_SIZE
+    tag = data[short_id_size:body_start]
+    if not hmac.compare_digest(tag, user_tag(short_id + data[body_start:], user_id, key)):
+        raise ValueError("Inline data belongs to another user")
+    count, pos = read_varint(data, body_start)
+    args = []
+    for _ in range(count):
+        value, pos = decode_value(data, pos)
+        args.append(value)
+
+    kwargs = {}
+    while pos < len(data):
+        index = data[pos]
+        kwargs[index], pos = decode_value(data, pos + 1)
+    return short_id, args, kwargs
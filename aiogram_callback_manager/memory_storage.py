@@ -0,0 +1,193 @@
+import heapq
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .base_db_storage import CallbackDataStorage
+
+_Key = Tuple[str, int]
+
+
+class _ExpiryBuckets:
+    """
+          Корзины записей по времени: устаревшие корзины удаляются целиком, без обхода всех записей.
+    """
+
+    def __init__(self, bucket_size: float):
+        self.bucket_size = bucket_size
+        self._buckets: Dict[int, Set[_Key]] = {}
+        self._heap: List[int] = []
+
+    def add(self, key: _Key, moment: float) -> int:
+        bucket = int(moment // self.bucket_size)
+        keys = self._buckets.get(bucket)
+        if keys is None:
+            keys = self._buckets[bucket] = set()
+            heapq.heappush(self._heap, bucket)
+        keys.add(key)
+        return bucket
+
+    def discard(self, key: _Key, bucket: int):
+        keys = self._buckets.get(bucket)
+        if keys is not None:
+            keys.discard(key)
+
+    def expired(self, border: float, moment_of: Callable[[_Key], float]) -> List[_Key]:
+        border_bucket = int(border // self.bucket_size)
+        result = []
+        while self._heap and self._heap[0] <= border_bucket:
+            bucket = self._heap[0]
+            keys = self._buckets[bucket]
+            if bucket < border_bucket:
+                result.extend(keys)
+                keys = set()
+            else:
+                # Граничная корзина: проверяем каждую запись
+                expired = [key for key in keys if moment_of(key) < border]
+                keys.difference_update(expired)
+                result.extend(expired)
+            if keys:
+                break
+            heapq.heappop(self._heap)
+            del self._buckets[bucket]
+        return result
+
+
+class _PayloadPool:
+    """
+          Одинаковые данные разных пользователей хранятся одним объектом со счетчиком ссылок.
+    """
+
+    def __init__(self):
+        self._payloads: Dict[str, List] = {}
+        self.size = 0
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def retain(self, data_hash: str, data_bytes: bytes) -> bytes:
+        entry = self._payloads.get(data_hash)
+        if entry is None:
+            self._payloads[data_hash] = [data_bytes, 1]
+            self.size += len(data_bytes)
+            return data_bytes
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, data_hash: str):
+        entry = self._payloads[data_hash]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._payloads[data_hash]
+            self.size -= len(entry[0])
+
+    def clear(self):
+        self._payloads.clear()
+        self.size = 0
+
+
+class _Entry(NamedTuple):
+    data_bytes: bytes
+    timestamp: float
+    expires_at: Optional[float]
+    bucket: int
+
+
+class MemoryStorage(CallbackDataStorage):
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None, bucket_size: float = 60):
+        """
+              Хранилище callback данных в памяти процесса, без сохранения между перезапусками.
+
+              :param max_entries: Максимальное количество записей, при превышении удаляются давно неиспользуемые.
+              :param max_bytes: Максимальный суммарный размер уникальных данных в байтах.
+              :param bucket_size: Размер корзины устаревания в секундах (точность clean_old).
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bucket_size = bucket_size
+        # Порядок записей — от давно использованных к недавним
+        self._data: "OrderedDict[_Key, _Entry]" = OrderedDict()
+        # Записи без собственного срока жизни раскладываются по времени создания, остальные — по expires_at
+        self._created_buckets = _ExpiryBuckets(bucket_size)
+        self._expires_buckets = _ExpiryBuckets(bucket_size)
+        self._payloads = _PayloadPool()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def size(self) -> int:
+        return self._payloads.size
+
+    async def init_db(self):
+        pass
+
+    async def stats(self) -> Dict[str, Any]:
+        return {'rows': len(self._data), 'payloads': len(self._payloads), 'size_bytes': self._payloads.size}
+
+    def _remove(self, key: _Key):
+        entry = self._data.pop(key)
+        self._payloads.release(key[0])
+        if entry.expires_at is None:
+            self._created_buckets.discard(key, entry.bucket)
+        else:
+            self._expires_buckets.discard(key, entry.bucket)
+
+    def _add(self, key: _Key, data_bytes: bytes, timestamp: float, expires_at: Optional[float]):
+        if key in self._data:
+            self._remove(key)
+
+        if expires_at is None:
+            bucket = self._created_buckets.add(key, timestamp)
+        else:
+            bucket = self._expires_buckets.add(key, expires_at)
+
+        data_bytes = self._payloads.retain(key[0], data_bytes)
+        self._data[key] = _Entry(data_bytes, timestamp, expires_at, bucket)
+        self._evict()
+
+    def _evict(self):
+        # Вытесняем давно не использованные записи при превышении лимитов
+        while self._data and (
+                (self.max_entries is not None and len(self._data) > self.max_entries)
+                or (self.max_bytes is not None and self._payloads.size > self.max_bytes)
+        ):
+            self._remove(next(iter(self._data)))
+
+    async def save(
+            self,
+            data_hash: str,
+            data_bytes: bytes,
+            timestamp: float,
+            user_id: int,
+            expires_at: Optional[float] = None
+    ):
+        self._add((data_hash, user_id), data_bytes, timestamp, expires_at)
+
+    async def load(self, data_hash: str, user_id: int) -> Optional[bytes]:
+        key = (data_hash, user_id)
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return entry.data_bytes
+
+    async def delete_many(self, keys: List[_Key]) -> int:
+        deleted = 0
+        for key in keys:
+            if key in self._data:
+                self._remove(key)
+                deleted += 1
+        return deleted
+
+    async def clean_old(self, expiry_time: int) -> int:
+        current_time = time.time()
+        expired = self._created_buckets.expired(current_time - expiry_time, lambda key: self._data[key].timestamp)
+        expired += self._expires_buckets.expired(current_time, lambda key: self._data[key].expires_at)
+        for key in expired:
+            del self._data[key]
+            self._payloads.release(key[0])
+        return len(expired)
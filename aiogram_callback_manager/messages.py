@@ -4,3 +4,4 @@ class MockMessage:
     HandlerNotFound = "Обработчик не найден."
     RequestProcessingError = "Произошла ошибка при обработке запроса."
 
+    Overloaded = "Бот перегружен, попробуйте еще раз через несколько секунд."
@@ -0,0 +1,144 @@
+import bisect
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+# Границы корзин гистограмм задержек в секундах
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# Описания метрик, которые пишут менеджер и хранилища
+METRICS_HELP = {
+    "lock_wait_seconds": "Time spent waiting for the storage lock",
+    "save_seconds": "Storage save latency",
+    "load_seconds": "Storage load latency",
+    "serialize_seconds": "Callback data serialization latency",
+    "deserialize_seconds": "Callback data deserialization latency",
+    "handler_seconds": "Callback handler execution time",
+    "clicks_total": "Callback queries handled by the manager",
+    "coalesced_clicks_total": "Duplicate clicks answered without running the handler",
+    "data_invalid_total": "Clicks with expired or invalid callback data",
+    "handler_not_found_total": "Clicks whose handler is not registered",
+    "handler_errors_total": "Exceptions raised by callback handlers",
+    "dispatch_queue_depth": "Clicks waiting for a dispatch slot",
+    "dispatch_wait_seconds": "Time clicks spent waiting for a dispatch slot",
+    "dispatch_shed_total": "Clicks rejected because the dispatch backlog was full",
+    "quota_evictions_total": "Entries evicted by per-user quotas",
+    "remote_request_seconds": "Round-trip time of requests to the storage server",
+    "skipped_writes_total": "Saves skipped because the same data was recently written",
+    "storage_rows": "Stored callback data entries",
+    "storage_payloads": "Stored unique callback payloads",
+    "storage_size_bytes": "Storage size in bytes",
+}
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "callback_manager", enabled: bool = True):
+        """
+              Реестр метрик менеджера: гистограммы задержек, счетчики и значения.
+
+              :param prefix: Префикс имен метрик при экспорте.
+              :param enabled: При False все вызовы ничего не делают.
+        """
+        self.prefix = prefix
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self._hooks: List[Callable[[str, str, float], None]] = []
+
+    def add_hook(self, hook: Callable[[str, str, float], None]):
+        """
+              Подписка на каждое измерение: hook(имя, тип, значение), например для трассировки.
+        """
+        self._hooks.append(hook)
+
+    def _notify(self, name: str, kind: str, value: float):
+        for hook in self._hooks:
+            hook(name, kind, value)
+
+    def observe(self, name: str, value: float):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(value)
+        if self._hooks:
+            self._notify(name, "histogram", value)
+
+    def inc(self, name: str, amount: float = 1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + amount
+        if self._hooks:
+            self._notify(name, "counter", amount)
+
+    def set(self, name: str, value: float):
+        if not self.enabled:
+            return
+        self.gauges[name] = value
+        if self._hooks:
+            self._notify(name, "gauge", value)
+
+    def timer(self, name: str):
+        if not self.enabled:
+            return nullcontext()
+        return self._timer(name)
+
+    @contextmanager
+    def _timer(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def render_prometheus(self) -> str:
+        """
+              Метрики в текстовом формате Prometheus.
+        """
+        lines = []
+        for kind, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+            for name, value in sorted(metrics.items()):
+                full_name = f"{self.prefix}_{name}"
+                lines += self._header(name, full_name, kind)
+                lines.append(f"{full_name} {_format(value)}")
+
+        for name, histogram in sorted(self.histograms.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines += self._header(name, full_name, "histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{full_name}_bucket{{le="{_format(bound)}"}} {cumulative}')
+            lines.append(f'{full_name}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{full_name}_sum {_format(histogram.sum)}")
+            lines.append(f"{full_name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _header(name: str, full_name: str, kind: str) -> List[str]:
+        help_text: Optional[str] = METRICS_HELP.get(name)
+        header = [f"# HELP {full_name} {help_text}"] if help_text else []
+        return header + [f"# TYPE {full_name} {kind}"]
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# Реестр по умолчанию: метрики выключены и почти ничего не стоят
+NULL_METRICS = MetricsRegistry(enabled=False)
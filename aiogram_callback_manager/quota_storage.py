@@ -0,0 +1,196 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .base_db_storage import CallbackDataStorage, CallbackRecord, SQLiteStorage
+from .cached_storage import CachedStorage
+from .metrics import MetricsRegistry
+from .sharded_storage import ShardedSQLiteStorage
+
+
+class _UserUsage:
+    __slots__ = ("entries", "bytes")
+
+    def __init__(self):
+        # hash -> (размер данных, created_at, expires_at); порядок — от давно использованных к недавним
+        self.entries: "OrderedDict[str, Tuple[int, float, Optional[float]]]" = OrderedDict()
+        self.bytes = 0
+
+    def add(self, data_hash: str, size: int, created_at: float, expires_at: Optional[float]):
+        self.discard(data_hash)
+        self.entries[data_hash] = (size, created_at, expires_at)
+        self.bytes += size
+
+    def discard(self, data_hash: str):
+        entry = self.entries.pop(data_hash, None)
+        if entry is not None:
+            self.bytes -= entry[0]
+
+
+def _enable_user_index(storage: CallbackDataStorage):
+    # Без индекса по user_id user_entries в SQLite читает всю таблицу доступа
+    if isinstance(storage, SQLiteStorage):
+        storage.user_index = True
+    elif isinstance(storage, ShardedSQLiteStorage):
+        for shard in storage.shards:
+            shard.user_index = True
+    elif isinstance(storage, (CachedStorage, QuotaStorage)):
+        _enable_user_index(storage.storage)
+
+
+class QuotaStorage(CallbackDataStorage):
+    def __init__(
+            self,
+            storage: CallbackDataStorage,
+            max_entries_per_user: Optional[int] = None,
+            max_bytes_per_user: Optional[int] = None,
+            max_tracked_users: Optional[int] = 10_000
+    ):
+        """
+              Ограничивает объем данных каждого пользователя поверх любого хранилища.
+              При превышении лимита удаляются давно не использованные записи этого пользователя.
+              Учет ведется в памяти: записи пользователя читаются из хранилища при первом сохранении.
+              В памяти держатся только недавно сохранявшие пользователи; учет вытесненного пользователя
+              заново читается из хранилища при его следующем сохранении.
+              Для SQLiteStorage и ShardedSQLiteStorage (в том числе под CachedStorage) включается user_index:
+              индекс создается при init_db.
+
+              :param storage: Хранилище, в котором лежат данные.
+              :param max_entries_per_user: Максимальное количество записей одного пользователя.
+              :param max_bytes_per_user: Максимальный суммарный размер данных одного пользователя в байтах.
+              :param max_tracked_users: Сколько пользователей держать в памяти; None — без ограничения.
+        """
+        if max_tracked_users is not None and max_tracked_users < 1:
+            raise ValueError("max_tracked_users must be positive")
+        _enable_user_index(storage)
+        self.storage = storage
+        self.max_entries_per_user = max_entries_per_user
+        self.max_bytes_per_user = max_bytes_per_user
+        self.max_tracked_users = max_tracked_users
+        # Порядок пользователей — от давно сохранявших к недавним
+        self._users: "OrderedDict[int, _UserUsage]" = OrderedDict()
+        self.evicted = 0
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        return self.storage.metrics
+
+    @metrics.setter
+    def metrics(self, metrics: MetricsRegistry):
+        self.storage.metrics = metrics
+
+    async def init_db(self):
+        await self.storage.init_db()
+
+    async def close(self):
+        await self.storage.close()
+
+    async def stats(self) -> Dict[str, Any]:
+        stats = dict(await self.storage.stats())
+        stats.update(quota_users=len(self._users), quota_evicted=self.evicted)
+        return stats
+
+    async def _usage(self, user_id: int) -> _UserUsage:
+        usage = self._users.get(user_id)
+        if usage is None:
+            entries = await self.storage.user_entries(user_id)
+            # Пока шел запрос, пользователя мог добавить конкурентный save
+            usage = self._users.get(user_id)
+            if usage is None:
+                usage = self._users[user_id] = _UserUsage()
+                for data_hash, size, created_at, expires_at in entries:
+                    usage.add(data_hash, size, created_at, expires_at)
+                self._evict_users()
+                return usage
+        self._users.move_to_end(user_id)
+        return usage
+
+    def _evict_users(self):
+        # Вытесненный пользователь не теряет данных: его записи остаются в хранилище
+        if self.max_tracked_users is not None:
+            while len(self._users) > self.max_tracked_users:
+                self._users.popitem(last=False)
+
+    def _over_quota(self, usage: _UserUsage) -> bool:
+        return (
+                (self.max_entries_per_user is not None and len(usage.entries) > self.max_entries_per_user)
+                or (self.max_bytes_per_user is not None and usage.bytes > self.max_bytes_per_user)
+        )
+
+    async def _enforce(self, user_id: int, usage: _UserUsage, keep: Set[str]):
+        # Только что сохраненные записи не вытесняются, даже если одна страница больше лимита
+        evicted = []
+        for data_hash in list(usage.entries):
+            if not self._over_quota(usage):
+                break
+            if data_hash not in keep:
+                usage.discard(data_hash)
+                evicted.append((data_hash, user_id))
+
+        if evicted:
+            self.evicted += len(evicted)
+            self.metrics.inc("quota_evictions_total", len(evicted))
+            await self.storage.delete_many(evicted)
+
+    async def save(
+            self,
+            data_hash: str,
+            data_bytes: bytes,
+            timestamp: float,
+            user_id: int,
+            expires_at: Optional[float] = None
+    ):
+        await self.save_many([CallbackRecord(data_hash, data_bytes, timestamp, user_id, expires_at)])
+
+    async def save_many(self, records: List[CallbackRecord]):
+        if not records:
+            return
+        by_user: Dict[int, List[CallbackRecord]] = {}
+        for record in records:
+            by_user.setdefault(record.user_id, []).append(record)
+        usages = {user_id: await self._usage(user_id) for user_id in by_user}
+
+        await self.storage.save_many(records)
+        for user_id, user_records in by_user.items():
+            usage = usages[user_id]
+            for record in user_records:
+                usage.add(record.data_hash, len(record.data_bytes), record.timestamp, record.expires_at)
+            await self._enforce(user_id, usage, {record.data_hash for record in user_records})
+
+    async def load(self, data_hash: str, user_id: int) -> Optional[bytes]:
+        data_bytes = await self.storage.load(data_hash, user_id)
+        usage = self._users.get(user_id)
+        if usage is not None and data_hash in usage.entries:
+            if data_bytes is None:
+                usage.discard(data_hash)
+            else:
+                usage.entries.move_to_end(data_hash)
+        return data_bytes
+
+    async def delete_many(self, keys: List[Tuple[str, int]]) -> int:
+        self._forget(keys)
+        return await self.storage.delete_many(keys)
+
+    async def user_entries(self, user_id: int) -> List[Tuple[str, int, float, Optional[float]]]:
+        return await self.storage.user_entries(user_id)
+
+    def _forget(self, keys: Iterable[Tuple[str, int]]):
+        for data_hash, user_id in keys:
+            usage = self._users.get(user_id)
+            if usage is not None:
+                usage.discard(data_hash)
+
+    async def clean_old(self, expiry_time: int):
+        deleted = await self.storage.clean_old(expiry_time)
+
+        # Учет повторяет правила очистки хранилища, поэтому перечитывать записи не нужно
+        current_time = time.time()
+        border = current_time - expiry_time
+        for user_id, usage in list(self._users.items()):
+            self._forget([
+                (data_hash, user_id) for data_hash, (_, created_at, expires_at) in usage.entries.items()
+                if (expires_at <= current_time if expires_at is not None else created_at < border)
+            ])
+            if not usage.entries:
+                del self._users[user_id]
+        return deleted
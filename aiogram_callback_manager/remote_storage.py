@@ -0,0 +1,578 @@
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .base_db_storage import CallbackDataStorage, CallbackRecord
+from .inline_data import read_varint, write_varint
+from .logger import logger
+
+# Путь к Unix-сокету или (host, port)
+Address = Union[str, Tuple[str, int]]
+
+# Кадр: длина тела u32, id запроса u32, код операции (в ответе — статус) u8, затем тело.
+# Клиент отправляет запросы, не дожидаясь ответов; сервер выполняет их параллельно
+# и отвечает в порядке готовности, ответ находится по id запроса.
+_HEADER = struct.Struct("<IIB")
+_DOUBLE = struct.Struct("<d")
+
+_SAVE_MANY, _LOAD_MANY, _DELETE_MANY, _USER_ENTRIES, _CLEAN_OLD, _STATS = range(1, 7)
+_OK, _ERROR = 0, 1
+
+# Размер буфера записи, после которого отправитель ждет, пока сокет его разгрузит
+_WRITE_BUFFER_LIMIT = 1 << 20
+# Максимальный размер тела кадра по умолчанию; кадр больше него закрывает соединение
+DEFAULT_MAX_FRAME_SIZE = 16 << 20
+# Сколько запросов одного соединения сервер выполняет одновременно; остальные ждут в сокете
+_MAX_IN_FLIGHT = 256
+# Сколько ключей клиент отправляет в одном LOAD_MANY
+_LOAD_BATCH_SIZE = 256
+# Ответ LOAD_MANY: 0 — записи нет, 1 — данные, 2 — данные не помещаются в кадр
+_MISSING, _FOUND, _TOO_LARGE = range(3)
+# Запас под количество значений в начале ответа
+_COUNT_RESERVE = 10
+
+# Взаимная проверка общего секрета при подключении:
+# сервер -> nonce сервера; клиент -> nonce клиента + HMAC("client"); сервер -> HMAC("server").
+# Сам секрет по сети не передается
+_NONCE_SIZE = 16
+_PROOF_SIZE = hashlib.sha256().digest_size
+_HANDSHAKE_TIMEOUT = 10
+
+
+class RemoteStorageError(Exception):
+    pass
+
+
+def _check_secret(address: Address, secret: Optional[bytes]):
+    # Данные из хранилища менеджер передает в pickle.loads: без проверки любой, кто достучится до порта,
+    # мог бы подложить запись и выполнить код в процессах бота
+    if not isinstance(address, str) and not secret:
+        raise ValueError("secret is required for TCP connections")
+
+
+def _proof(secret: bytes, role: bytes, server_nonce: bytes, client_nonce: bytes) -> bytes:
+    return hmac.new(secret, role + server_nonce + client_nonce, hashlib.sha256).digest()
+
+
+async def _server_handshake(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, secret: bytes) -> bool:
+    server_nonce = os.urandom(_NONCE_SIZE)
+    writer.write(server_nonce)
+    answer = await reader.readexactly(_NONCE_SIZE + _PROOF_SIZE)
+    client_nonce, proof = answer[:_NONCE_SIZE], answer[_NONCE_SIZE:]
+    if not hmac.compare_digest(proof, _proof(secret, b"client", server_nonce, client_nonce)):
+        return False
+    writer.write(_proof(secret, b"server", server_nonce, client_nonce))
+    return True
+
+
+async def _client_handshake(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, secret: bytes):
+    server_nonce = await reader.readexactly(_NONCE_SIZE)
+    client_nonce = os.urandom(_NONCE_SIZE)
+    writer.write(client_nonce + _proof(secret, b"client", server_nonce, client_nonce))
+    proof = await reader.readexactly(_PROOF_SIZE)
+    if not hmac.compare_digest(proof, _proof(secret, b"server", server_nonce, client_nonce)):
+        raise RemoteStorageError("storage server failed authentication")
+
+
+def _write_int(buffer: bytearray, value: int):
+    # zigzag: id групповых чатов отрицательные
+    write_varint(buffer, value * 2 if value >= 0 else -value * 2 - 1)
+
+
+def _read_int(data: bytes, pos: int) -> Tuple[int, int]:
+    value, pos = read_varint(data, pos)
+    return (value >> 1) ^ -(value & 1), pos
+
+
+def _write_bytes(buffer: bytearray, value: bytes):
+    write_varint(buffer, len(value))
+    buffer += value
+
+
+def _read_bytes(data: bytes, pos: int) -> Tuple[bytes, int]:
+    length, pos = read_varint(data, pos)
+    return bytes(data[pos:pos + length]), pos + length
+
+
+def _write_str(buffer: bytearray, value: str):
+    _write_bytes(buffer, value.encode())
+
+
+def _read_str(data: bytes, pos: int) -> Tuple[str, int]:
+    value, pos = _read_bytes(data, pos)
+    return value.decode(), pos
+
+
+def _write_float(buffer: bytearray, value: Optional[float]):
+    if value is None:
+        buffer.append(0)
+    else:
+        buffer.append(1)
+        buffer += _DOUBLE.pack(value)
+
+
+def _read_float(data: bytes, pos: int) -> Tuple[Optional[float], int]:
+    if not data[pos]:
+        return None, pos + 1
+    return _DOUBLE.unpack_from(data, pos + 1)[0], pos + 1 + _DOUBLE.size
+
+
+def _encode_keys(keys: List[Tuple[str, int]]) -> bytearray:
+    buffer = bytearray()
+    write_varint(buffer, len(keys))
+    for data_hash, user_id in keys:
+        _write_str(buffer, data_hash)
+        _write_int(buffer, user_id)
+    return buffer
+
+
+def _decode_keys(data: bytes) -> List[Tuple[str, int]]:
+    count, pos = read_varint(data, 0)
+    keys = []
+    for _ in range(count):
+        data_hash, pos = _read_str(data, pos)
+        user_id, pos = _read_int(data, pos)
+        keys.append((data_hash, user_id))
+    return keys
+
+
+def _encode_records(records: List[CallbackRecord]) -> bytearray:
+    buffer = bytearray()
+    write_varint(buffer, len(records))
+    for record in records:
+        _write_str(buffer, record.data_hash)
+        _write_bytes(buffer, record.data_bytes)
+        _write_float(buffer, record.timestamp)
+        _write_int(buffer, record.user_id)
+        _write_float(buffer, record.expires_at)
+    return buffer
+
+
+def _record_chunks(records: List[CallbackRecord], max_size: int) -> Iterator[List[CallbackRecord]]:
+    # Оценка сверху размера записи в кадре: строки и данные плюс varint-длины, числа и флаги
+    chunk, size = [], 0
+    for record in records:
+        record_size = len(record.data_hash) * 4 + len(record.data_bytes) + 48
+        if chunk and size + record_size > max_size:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(record)
+        size += record_size
+    if chunk:
+        yield chunk
+
+
+def _decode_records(data: bytes) -> List[CallbackRecord]:
+    count, pos = read_varint(data, 0)
+    records = []
+    for _ in range(count):
+        data_hash, pos = _read_str(data, pos)
+        data_bytes, pos = _read_bytes(data, pos)
+        timestamp, pos = _read_float(data, pos)
+        user_id, pos = _read_int(data, pos)
+        expires_at, pos = _read_float(data, pos)
+        records.append(CallbackRecord(data_hash, data_bytes, timestamp, user_id, expires_at))
+    return records
+
+
+class StorageServer:
+    def __init__(
+            self,
+            storage: CallbackDataStorage,
+            address: Address,
+            secret: Optional[bytes] = None,
+            max_frame_size: int = DEFAULT_MAX_FRAME_SIZE,
+            socket_mode: int = 0o600
+    ):
+        """
+              Сервер, через который несколько процессов бота работают с одним хранилищем.
+              Клиенты получают данные, которые менеджер десериализует через pickle, поэтому сервер
+              должен быть доступен только процессам бота: Unix-сокет с правами владельца или TCP с секретом.
+
+              :param storage: Хранилище, к которому обращаются клиенты.
+              :param address: Путь к Unix-сокету или кортеж (host, port) для TCP.
+              :param secret: Общий секрет клиентов и сервера; обязателен для TCP.
+              :param max_frame_size: Максимальный размер запроса в байтах; больший закрывает соединение.
+              :param socket_mode: Права файла Unix-сокета.
+        """
+        _check_secret(address, secret)
+        self.storage = storage
+        self.address = address
+        self.secret = secret
+        self.max_frame_size = max_frame_size
+        self.socket_mode = socket_mode
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set = set()
+
+    async def start(self):
+        await self.storage.init_db()
+        if isinstance(self.address, str):
+            self._server = await asyncio.start_unix_server(self._handle, path=self.address)
+            if not self.address.startswith("\0"):
+                os.chmod(self.address, self.socket_mode)
+        else:
+            host, port = self.address
+            self._server = await asyncio.start_server(self._handle, host, port)
+            # Порт 0 выбирает система, клиентам нужен настоящий
+            self.address = self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.storage.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        tasks = set()
+        in_flight = asyncio.Semaphore(_MAX_IN_FLIGHT)
+
+        def done(task: asyncio.Task):
+            tasks.discard(task)
+            in_flight.release()
+
+        try:
+            if self.secret is not None:
+                if not await asyncio.wait_for(_server_handshake(reader, writer, self.secret), _HANDSHAKE_TIMEOUT):
+                    logger.warning("Storage client failed authentication")
+                    return
+            while True:
+                length, request_id, opcode = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                if length > self.max_frame_size:
+                    # Тело такого кадра не читается, а без него нельзя перейти к следующему
+                    logger.warning(f"Storage request of {length} bytes exceeds max_frame_size")
+                    return
+                body = await reader.readexactly(length) if length else b""
+                # Следующий запрос читается, не дожидаясь ответа на текущий
+                await in_flight.acquire()
+                task = asyncio.create_task(self._respond(writer, request_id, opcode, body))
+                tasks.add(task)
+                task.add_done_callback(done)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, request_id: int, opcode: int, body: bytes):
+        try:
+            status, result = _OK, await self._execute(opcode, body)
+        except Exception as e:
+            status, result = _ERROR, f"{type(e).__name__}: {e}".encode()
+        if len(result) > self.max_frame_size:
+            # Клиент закрыл бы соединение вместе со всеми его запросами; ошибка получит только этот запрос
+            status, result = _ERROR, f"response of {len(result)} bytes exceeds max_frame_size".encode()
+        if writer.is_closing():
+            return
+        writer.write(_HEADER.pack(len(result), request_id, status) + result)
+        if writer.transport.get_write_buffer_size() > _WRITE_BUFFER_LIMIT:
+            await writer.drain()
+
+    async def _execute(self, opcode: int, body: bytes) -> bytes:
+        result = bytearray()
+        if opcode == _SAVE_MANY:
+            await self.storage.save_many(_decode_records(body))
+        elif opcode == _LOAD_MANY:
+            keys = _decode_keys(body)
+            values = await asyncio.gather(*[self.storage.load(data_hash, user_id) for data_hash, user_id in keys])
+            # Ответ не больше max_frame_size: значения, которые не поместились, клиент запросит снова
+            items = bytearray()
+            count = 0
+            for value in values:
+                item = bytearray()
+                if value is None:
+                    item.append(_MISSING)
+                else:
+                    item.append(_FOUND)
+                    _write_bytes(item, value)
+                if len(item) + _COUNT_RESERVE > self.max_frame_size:
+                    item = bytearray([_TOO_LARGE])
+                if len(items) + len(item) + _COUNT_RESERVE > self.max_frame_size:
+                    break
+                items += item
+                count += 1
+            write_varint(result, count)
+            result += items
+        elif opcode == _DELETE_MANY:
+            write_varint(result, await self.storage.delete_many(_decode_keys(body)) or 0)
+        elif opcode == _USER_ENTRIES:
+            entries = await self.storage.user_entries(_read_int(body, 0)[0])
+            write_varint(result, len(entries))
+            for data_hash, size, created_at, expires_at in entries:
+                _write_str(result, data_hash)
+                write_varint(result, size)
+                _write_float(result, created_at)
+                _write_float(result, expires_at)
+        elif opcode == _CLEAN_OLD:
+            write_varint(result, await self.storage.clean_old(_DOUBLE.unpack(body)[0]) or 0)
+        elif opcode == _STATS:
+            result += json.dumps(await self.storage.stats()).encode()
+        else:
+            raise RemoteStorageError(f"unknown opcode {opcode}")
+        return bytes(result)
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_frame_size: int):
+        self.reader = reader
+        self.writer = writer
+        self.max_frame_size = max_frame_size
+        self.futures: Dict[int, asyncio.Future] = {}
+        self.reader_task = asyncio.create_task(self._read_responses())
+
+    @property
+    def closed(self) -> bool:
+        return self.reader_task.done()
+
+    async def request(self, request_id: int, opcode: int, body: bytes) -> bytes:
+        future = asyncio.get_running_loop().create_future()
+        self.futures[request_id] = future
+        self.writer.write(_HEADER.pack(len(body), request_id, opcode) + body)
+        if self.writer.transport.get_write_buffer_size() > _WRITE_BUFFER_LIMIT:
+            await self.writer.drain()
+        return await future
+
+    async def _read_responses(self):
+        error: Exception = RemoteStorageError("connection closed")
+        try:
+            while True:
+                length, request_id, status = _HEADER.unpack(await self.reader.readexactly(_HEADER.size))
+                if length > self.max_frame_size:
+                    raise RemoteStorageError(f"response of {length} bytes exceeds max_frame_size")
+                body = await self.reader.readexactly(length) if length else b""
+                future = self.futures.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if status == _OK:
+                    future.set_result(body)
+                else:
+                    future.set_exception(RemoteStorageError(body.decode()))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            error = RemoteStorageError(f"connection closed: {e}")
+        except RemoteStorageError as e:
+            error = e
+        finally:
+            self.writer.close()
+            for future in self.futures.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.futures.clear()
+
+    async def close(self):
+        self.writer.close()
+        self.reader_task.cancel()
+        await asyncio.gather(self.reader_task, return_exceptions=True)
+
+
+class RemoteStorage(CallbackDataStorage):
+    def __init__(
+            self,
+            address: Address,
+            pool_size: int = 4,
+            batch_delay: float = 0,
+            secret: Optional[bytes] = None,
+            max_frame_size: int = DEFAULT_MAX_FRAME_SIZE
+    ):
+        """
+              Клиент StorageServer. Запросы распределяются по нескольким соединениям,
+              а save и load, вызванные одновременно, уходят на сервер одним запросом.
+
+              :param address: Путь к Unix-сокету или кортеж (host, port) сервера.
+              :param pool_size: Количество соединений с сервером.
+              :param batch_delay: Сколько секунд копить save и load перед отправкой;
+                                  0 — до конца текущей итерации event loop.
+              :param secret: Общий секрет, заданный серверу; обязателен для TCP.
+              :param max_frame_size: Максимальный размер запроса и ответа в байтах.
+        """
+        if pool_size < 1:
+            raise ValueError("pool_size must be positive")
+        _check_secret(address, secret)
+        self.address = address
+        self.secret = secret
+        self.max_frame_size = max_frame_size
+        self.pool_size = pool_size
+        self.batch_delay = batch_delay
+        self._connections: List[Optional[_Connection]] = [None] * pool_size
+        self._connect_lock = asyncio.Lock()
+        self._next_connection = itertools.cycle(range(pool_size))
+        self._request_ids = itertools.count(1)
+        self._pending_saves: List[CallbackRecord] = []
+        self._saves_future: Optional[asyncio.Future] = None
+        self._pending_loads: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._flush_tasks = set()
+
+    async def _open(self) -> _Connection:
+        try:
+            if isinstance(self.address, str):
+                reader, writer = await asyncio.open_unix_connection(self.address)
+            else:
+                reader, writer = await asyncio.open_connection(*self.address)
+        except OSError as e:
+            raise RemoteStorageError(f"cannot connect to {self.address}: {e}") from e
+        if self.secret is not None:
+            try:
+                await asyncio.wait_for(_client_handshake(reader, writer, self.secret), _HANDSHAKE_TIMEOUT)
+            except (asyncio.IncompleteReadError, ConnectionError, asyncio.TimeoutError) as e:
+                writer.close()
+                raise RemoteStorageError(f"storage server rejected the connection: {e!r}") from e
+            except RemoteStorageError:
+                writer.close()
+                raise
+        return _Connection(reader, writer, self.max_frame_size)
+
+    async def _connection(self) -> _Connection:
+        index = next(self._next_connection)
+        connection = self._connections[index]
+        if connection is None or connection.closed:
+            async with self._connect_lock:
+                connection = self._connections[index]
+                # Соединение, оборванное сервером, открывается заново при следующем запросе
+                if connection is None or connection.closed:
+                    connection = self._connections[index] = await self._open()
+        return connection
+
+    async def _request(self, opcode: int, body: bytes = b"") -> bytes:
+        if len(body) > self.max_frame_size:
+            raise RemoteStorageError(f"request of {len(body)} bytes exceeds max_frame_size")
+        connection = await self._connection()
+        with self.metrics.timer("remote_request_seconds"):
+            return await connection.request(next(self._request_ids) & 0xFFFFFFFF, opcode, bytes(body))
+
+    async def init_db(self):
+        for _ in range(self.pool_size):
+            await self._connection()
+
+    async def close(self):
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        connections = [connection for connection in self._connections if connection is not None]
+        self._connections = [None] * self.pool_size
+        await asyncio.gather(*[connection.close() for connection in connections])
+
+    def _schedule(self, flush):
+        async def run():
+            if self.batch_delay:
+                await asyncio.sleep(self.batch_delay)
+            else:
+                # Даем остальным корутинам этой итерации добавить свои записи
+                await asyncio.sleep(0)
+            await flush()
+
+        task = asyncio.create_task(run())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def save(
+            self,
+            data_hash: str,
+            data_bytes: bytes,
+            timestamp: float,
+            user_id: int,
+            expires_at: Optional[float] = None
+    ):
+        await self.save_many([CallbackRecord(data_hash, data_bytes, timestamp, user_id, expires_at)])
+
+    async def save_many(self, records: List[CallbackRecord]):
+        if not records:
+            return
+        self._pending_saves.extend(records)
+        if self._saves_future is None:
+            self._saves_future = asyncio.get_running_loop().create_future()
+            self._schedule(self._flush_saves)
+        await asyncio.shield(self._saves_future)
+
+    async def _flush_saves(self):
+        records, self._pending_saves = self._pending_saves, []
+        future, self._saves_future = self._saves_future, None
+        try:
+            # Большая пачка отправляется несколькими кадрами, каждый не больше max_frame_size
+            for chunk in _record_chunks(records, self.max_frame_size):
+                await self._request(_SAVE_MANY, _encode_records(chunk))
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение получат ожидающие save; здесь оно не должно попасть в лог как забытое
+            future.exception()
+        else:
+            future.set_result(None)
+
+    async def load(self, data_hash: str, user_id: int) -> Optional[bytes]:
+        key = (data_hash, user_id)
+        future = self._pending_loads.get(key)
+        if future is None:
+            if not self._pending_loads:
+                self._schedule(self._flush_loads)
+            future = self._pending_loads[key] = asyncio.get_running_loop().create_future()
+        return await asyncio.shield(future)
+
+    async def _flush_loads(self):
+        pending, self._pending_loads = self._pending_loads, {}
+        keys = list(pending)
+        await asyncio.gather(*[self._load_batch(keys[start:start + _LOAD_BATCH_SIZE], pending)
+                               for start in range(0, len(keys), _LOAD_BATCH_SIZE)])
+
+    async def _load_batch(self, keys: List[Tuple[str, int]], pending: Dict[Tuple[str, int], asyncio.Future]):
+        try:
+            while keys:
+                data = await self._request(_LOAD_MANY, _encode_keys(keys))
+                count, pos = read_varint(data, 0)
+                if not count:
+                    raise RemoteStorageError("empty load response")
+                for key in keys[:count]:
+                    flag, pos = data[pos], pos + 1
+                    if flag == _FOUND:
+                        value, pos = _read_bytes(data, pos)
+                        pending[key].set_result(value)
+                    elif flag == _TOO_LARGE:
+                        pending[key].set_exception(RemoteStorageError("stored data exceeds max_frame_size"))
+                        pending[key].exception()
+                    else:
+                        pending[key].set_result(None)
+                # Сервер вернул столько значений, сколько поместилось в кадр; остальные запрашиваются снова
+                keys = keys[count:]
+        except Exception as e:
+            for key in keys:
+                future = pending[key]
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()
+
+    async def delete_many(self, keys: List[Tuple[str, int]]) -> int:
+        if not keys:
+            return 0
+        return read_varint(await self._request(_DELETE_MANY, _encode_keys(keys)), 0)[0]
+
+    async def user_entries(self, user_id: int) -> List[Tuple[str, int, float, Optional[float]]]:
+        body = bytearray()
+        _write_int(body, user_id)
+        data = await self._request(_USER_ENTRIES, body)
+        count, pos = read_varint(data, 0)
+        entries = []
+        for _ in range(count):
+            data_hash, pos = _read_str(data, pos)
+            size, pos = read_varint(data, pos)
+            created_at, pos = _read_float(data, pos)
+            expires_at, pos = _read_float(data, pos)
+            entries.append((data_hash, size, created_at, expires_at))
+        return entries
+
+    async def clean_old(self, expiry_time: int) -> int:
+        return read_varint(await self._request(_CLEAN_OLD, _DOUBLE.pack(expiry_time)), 0)[0]
+
+    async def stats(self) -> Dict[str, Any]:
+        return json.loads(await self._request(_STATS))
+
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Optional
+
+from .metrics import MetricsRegistry, NULL_METRICS
+
+
+class DispatchOverloaded(Exception):
+    """
+          Очередь планировщика заполнена, нажатие не будет обработано.
+    """
+
+
+class DispatchScheduler:
+    # Менеджер подставляет сюда свой реестр метрик
+    metrics: MetricsRegistry = NULL_METRICS
+
+    def __init__(self, max_concurrency: int = 32, max_backlog: int = 1000, max_user_backlog: Optional[int] = None):
+        """
+              Ограничивает количество одновременно обрабатываемых нажатий.
+              Ожидающие нажатия хранятся в очередях пользователей, свободное место отдается пользователям по кругу,
+              поэтому всплеск нажатий одного пользователя не задерживает остальных.
+
+              :param max_concurrency: Максимум одновременно обрабатываемых нажатий.
+              :param max_backlog: Максимум ожидающих нажатий; сверх него нажатия отклоняются.
+              :param max_user_backlog: Максимум ожидающих нажатий одного пользователя.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_backlog = max_backlog
+        self.max_user_backlog = max_user_backlog
+        self.running = 0
+        self.backlog = 0
+        # user_id -> очередь ожидающих; порядок ключей — очередь обхода пользователей
+        self._queues: "OrderedDict[int, Deque[asyncio.Future]]" = OrderedDict()
+
+    async def submit(self, user_id: int, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+              Выполняет func, когда до пользователя дойдет очередь.
+
+              :raises DispatchOverloaded: Общая очередь или очередь пользователя заполнена.
+        """
+        if self.running < self.max_concurrency and not self._queues:
+            self.running += 1
+        else:
+            await self._wait_turn(user_id)
+        try:
+            return await func()
+        finally:
+            self._release()
+
+    async def _wait_turn(self, user_id: int):
+        queue = self._queues.get(user_id)
+        if self.backlog >= self.max_backlog or (
+                queue is not None and self.max_user_backlog is not None and len(queue) >= self.max_user_backlog
+        ):
+            raise DispatchOverloaded()
+
+        turn = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+        queue.append(turn)
+        self.backlog += 1
+        self.metrics.set("dispatch_queue_depth", self.backlog)
+
+        started = time.perf_counter()
+        try:
+            await turn
+        except asyncio.CancelledError:
+            # Место уже передано этой корутине: отдаем его следующему.
+            # Отмененное ожидание остается в очереди и пропускается при обходе
+            if turn.done() and not turn.cancelled():
+                self._release()
+            raise
+        self.metrics.observe("dispatch_wait_seconds", time.perf_counter() - started)
+
+    def _release(self):
+        # Освободившееся место сразу передается первому пользователю в очереди обхода
+        while self._queues:
+            user_id, queue = self._queues.popitem(last=False)
+            turn = queue.popleft()
+            self.backlog -= 1
+            if queue:
+                self._queues[user_id] = queue
+            if not turn.done():
+                turn.set_result(None)
+                self.metrics.set("dispatch_queue_depth", self.backlog)
+                return
+        self.running -= 1
+        self.metrics.set("dispatch_queue_depth", self.backlog)
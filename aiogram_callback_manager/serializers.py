@@ -0,0 +1,271 @@
+import dataclasses
+import importlib
+import json
+import lzma
+import pickle
+import struct
+import zlib
+from dataclasses import asdict, is_dataclass
+from typing import Any, Callable, Dict, Tuple
+
+from .inline_data import write_varint, read_varint
+
+# Первый байт сохраненных данных определяет формат.
+# Pickle (протокол 2+) начинается с 0x80, JSON — с "{", поэтому старые записи читаются без тега.
+COMPACT_TAG = 0x01
+ZLIB_TAG = 0x02
+LZMA_TAG = 0x03
+_PICKLE_MARK = 0x80
+
+# Теги значений компактного кодека
+(_NONE, _TRUE, _FALSE, _INT, _FLOAT, _STR, _BYTES, _LIST, _TUPLE, _DICT, _SET, _DATACLASS,
+ _PICKLED) = range(13)
+
+_double = struct.Struct("<d")
+
+
+class Serializer:
+    """
+          Интерфейс сериализации callback данных.
+          Чтение общее для всех форматов: формат определяется по первому байту.
+    """
+
+    def dumps(self, data: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data_bytes: bytes) -> Any:
+        return loads(data_bytes)
+
+
+class PickleSerializer(Serializer):
+    def dumps(self, data: Any) -> bytes:
+        return pickle.dumps(data)
+
+
+class JsonSerializer(Serializer):
+    def dumps(self, data: Any) -> bytes:
+        if is_dataclass(data):
+            data = asdict(data)
+        return json.dumps(data, ensure_ascii=False).encode()
+
+
+class CompactSerializer(Serializer):
+    """
+          Компактный бинарный формат: varint для чисел, длины вместо разделителей,
+          dataclass хранится как путь к классу и значения полей без имен.
+          Неподдерживаемые объекты сохраняются через pickle.
+          Кодек написан на Python и в несколько раз медленнее PickleSerializer: он экономит место
+          в хранилище ценой времени сериализации.
+    """
+
+    def dumps(self, data: Any) -> bytes:
+        buffer = bytearray((COMPACT_TAG,))
+        _encode(buffer, data)
+        return bytes(buffer)
+
+
+class CompressedSerializer(Serializer):
+    def __init__(self, serializer: Serializer, threshold: int = 1024, method: str = "zlib", level: int = 6):
+        """
+              Сжимает результат другого сериализатора, если он больше порога.
+
+              :param serializer: Сериализатор, результат которого сжимается.
+              :param threshold: Минимальный размер данных для сжатия в байтах.
+              :param method: "zlib" или "lzma".
+              :param level: Уровень сжатия.
+        """
+        if method not in ("zlib", "lzma"):
+            raise ValueError(f"Unknown compression method {method}")
+        self.serializer = serializer
+        self.threshold = threshold
+        self.method = method
+        self.level = level
+
+    def dumps(self, data: Any) -> bytes:
+        data_bytes = self.serializer.dumps(data)
+        if len(data_bytes) < self.threshold:
+            return data_bytes
+
+        if self.method == "zlib":
+            compressed = bytes((ZLIB_TAG,)) + zlib.compress(data_bytes, self.level)
+        else:
+            compressed = bytes((LZMA_TAG,)) + lzma.compress(data_bytes, preset=self.level)
+        # Несжимаемые данные сохраняются как есть
+        return compressed if len(compressed) < len(data_bytes) else data_bytes
+
+
+def loads(data_bytes: bytes) -> Any:
+    tag = data_bytes[0]
+    if tag == COMPACT_TAG:
+        value, _ = _decode(data_bytes, 1)
+        return value
+    if tag == ZLIB_TAG:
+        return loads(zlib.decompress(data_bytes[1:]))
+    if tag == LZMA_TAG:
+        return loads(lzma.decompress(data_bytes[1:]))
+    if tag == _PICKLE_MARK:
+        return pickle.loads(data_bytes, encoding="utf-8")
+    return json.loads(data_bytes.decode())
+
+
+_dataclass_fields: Dict[type, Tuple[str, ...]] = {}
+_dataclass_classes: Dict[str, Tuple[type, Tuple[str, ...]]] = {}
+
+
+def _fields_of(cls: type) -> Tuple[str, ...]:
+    names = _dataclass_fields.get(cls)
+    if names is None:
+        names = _dataclass_fields[cls] = tuple(f.name for f in dataclasses.fields(cls))
+    return names
+
+
+def _class_by_path(path: str) -> Tuple[type, Tuple[str, ...]]:
+    entry = _dataclass_classes.get(path)
+    if entry is None:
+        module_name, _, qualname = path.partition(":")
+        cls = importlib.import_module(module_name)
+        for part in qualname.split("."):
+            cls = getattr(cls, part)
+        entry = _dataclass_classes[path] = (cls, _fields_of(cls))
+    return entry
+
+
+def _write_str(buffer: bytearray, value: str):
+    raw = value.encode()
+    write_varint(buffer, len(raw))
+    buffer += raw
+
+
+def _read_str(data: bytes, pos: int) -> Tuple[str, int]:
+    length, pos = read_varint(data, pos)
+    return data[pos:pos + length].decode(), pos + length
+
+
+def _encode_int(buffer: bytearray, value: int):
+    buffer.append(_INT)
+    write_varint(buffer, value * 2 if value >= 0 else -value * 2 - 1)
+
+
+def _encode_float(buffer: bytearray, value: float):
+    buffer.append(_FLOAT)
+    buffer += _double.pack(value)
+
+
+def _encode_str(buffer: bytearray, value: str):
+    buffer.append(_STR)
+    _write_str(buffer, value)
+
+
+def _encode_bytes(buffer: bytearray, value: bytes):
+    buffer.append(_BYTES)
+    write_varint(buffer, len(value))
+    buffer += value
+
+
+def _encode_sequence(tag: int) -> Callable[[bytearray, Any], None]:
+    def encode(buffer: bytearray, value):
+        buffer.append(tag)
+        write_varint(buffer, len(value))
+        for item in value:
+            _encode(buffer, item)
+
+    return encode
+
+
+def _encode_dict(buffer: bytearray, value: dict):
+    buffer.append(_DICT)
+    write_varint(buffer, len(value))
+    for key, item in value.items():
+        _encode(buffer, key)
+        _encode(buffer, item)
+
+
+_encoders: Dict[type, Callable[[bytearray, Any], None]] = {
+    int: _encode_int,
+    float: _encode_float,
+    str: _encode_str,
+    bytes: _encode_bytes,
+    list: _encode_sequence(_LIST),
+    tuple: _encode_sequence(_TUPLE),
+    set: _encode_sequence(_SET),
+    dict: _encode_dict,
+}
+
+
+def _encode(buffer: bytearray, value: Any):
+    if value is None:
+        buffer.append(_NONE)
+        return
+    if value is True:
+        buffer.append(_TRUE)
+        return
+    if value is False:
+        buffer.append(_FALSE)
+        return
+
+    cls = type(value)
+    encoder = _encoders.get(cls)
+    if encoder is not None:
+        encoder(buffer, value)
+    elif is_dataclass(cls) and "<locals>" not in cls.__qualname__:
+        # dataclass: путь к классу и значения полей по порядку, без имен полей
+        names = _fields_of(cls)
+        buffer.append(_DATACLASS)
+        _write_str(buffer, f"{cls.__module__}:{cls.__qualname__}")
+        write_varint(buffer, len(names))
+        for name in names:
+            _encode(buffer, getattr(value, name))
+    else:
+        raw = pickle.dumps(value)
+        buffer.append(_PICKLED)
+        write_varint(buffer, len(raw))
+        buffer += raw
+
+
+def _decode(data: bytes, pos: int) -> Tuple[Any, int]:
+    tag = data[pos]
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _INT:
+        value, pos = read_varint(data, pos)
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+    if tag == _FLOAT:
+        return _double.unpack_from(data, pos)[0], pos + _double.size
+    if tag == _STR:
+        return _read_str(data, pos)
+    if tag in (_BYTES, _PICKLED):
+        length, pos = read_varint(data, pos)
+        raw = data[pos:pos + length]
+        return (bytes(raw) if tag == _BYTES else pickle.loads(raw, encoding="utf-8")), pos + length
+    if tag in (_LIST, _TUPLE, _SET):
+        count, pos = read_varint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return (items if tag == _LIST else tuple(items) if tag == _TUPLE else set(items)), pos
+    if tag == _DICT:
+        count, pos = read_varint(data, pos)
+        result = {}
+        for _ in range(count):
+            key, pos = _decode(data, pos)
+            result[key], pos = _decode(data, pos)
+        return result, pos
+    if tag == _DATACLASS:
+        path, pos = _read_str(data, pos)
+        cls, names = _class_by_path(path)
+        count, pos = read_varint(data, pos)
+        # Объект собирается без __init__, как это делает pickle
+        value = object.__new__(cls)
+        for index in range(count):
+            item, pos = _decode(data, pos)
+            # Поля, удаленные из класса после сохранения, пропускаются
+            if index < len(names):
+                object.__setattr__(value, names[index], item)
+        return value, pos
+    raise ValueError(f"Unknown compact value tag {tag}")
@@ -0,0 +1,98 @@
+import asyncio
+import pathlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .base_db_storage import CallbackDataStorage, CallbackRecord, SQLiteStorage
+from .metrics import MetricsRegistry
+
+
+class ShardedSQLiteStorage(CallbackDataStorage):
+    def __init__(self, db_path: str, shards: int = 4, **sqlite_options):
+        """
+              Хранилище из нескольких файлов SQLite, распределенных по user_id.
+              У каждого файла свое соединение и своя блокировка, поэтому записи разных пользователей
+              не ждут друг друга.
+
+              :param db_path: Путь к базе; "{shard}" заменяется номером файла,
+                              иначе номер добавляется перед расширением (callback_data_0.db).
+              :param shards: Количество файлов. Изменение количества делает старые кнопки недоступными.
+              :param sqlite_options: Параметры SQLiteStorage для каждого файла.
+        """
+        if shards < 1:
+            raise ValueError("shards must be positive")
+        self.db_path = db_path
+        self.shards: List[SQLiteStorage] = [
+            SQLiteStorage(self._shard_path(db_path, index), **sqlite_options) for index in range(shards)
+        ]
+
+    @staticmethod
+    def _shard_path(db_path: str, index: int) -> str:
+        if "{shard}" in db_path:
+            return db_path.format(shard=index)
+        path = pathlib.Path(db_path)
+        return str(path.with_name(f"{path.stem}_{index}{path.suffix}"))
+
+    def _shard(self, user_id: int) -> SQLiteStorage:
+        return self.shards[user_id % len(self.shards)]
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        return self.shards[0].metrics
+
+    @metrics.setter
+    def metrics(self, metrics: MetricsRegistry):
+        for shard in self.shards:
+            shard.metrics = metrics
+
+    async def init_db(self):
+        await asyncio.gather(*[shard.init_db() for shard in self.shards])
+
+    async def flush(self):
+        await asyncio.gather(*[shard.flush() for shard in self.shards])
+
+    async def close(self):
+        await asyncio.gather(*[shard.close() for shard in self.shards])
+
+    async def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = defaultdict(int)
+        for shard_stats in await asyncio.gather(*[shard.stats() for shard in self.shards]):
+            for name, value in shard_stats.items():
+                stats[name] += value
+        stats['shards'] = len(self.shards)
+        return dict(stats)
+
+    async def save(
+            self,
+            data_hash: str,
+            data_bytes: bytes,
+            timestamp: float,
+            user_id: int,
+            expires_at: Optional[float] = None
+    ):
+        await self._shard(user_id).save(data_hash, data_bytes, timestamp, user_id, expires_at)
+
+    async def save_many(self, records: List[CallbackRecord]):
+        # Обычно все записи страницы принадлежат одному пользователю и попадают в один файл
+        by_shard: Dict[int, List[CallbackRecord]] = defaultdict(list)
+        for record in records:
+            by_shard[record.user_id % len(self.shards)].append(record)
+        await asyncio.gather(*[self.shards[index].save_many(shard_records)
+                               for index, shard_records in by_shard.items()])
+
+    async def load(self, data_hash: str, user_id: int) -> Optional[bytes]:
+        return await self._shard(user_id).load(data_hash, user_id)
+
+    async def delete_many(self, keys: List[Tuple[str, int]]) -> int:
+        by_shard: Dict[int, List[Tuple[str, int]]] = defaultdict(list)
+        for key in keys:
+            by_shard[key[1] % len(self.shards)].append(key)
+        return sum(await asyncio.gather(*[self.shards[index].delete_many(shard_keys)
+                                          for index, shard_keys in by_shard.items()]))
+
+    async def user_entries(self, user_id: int) -> List[Tuple[str, int, float, Optional[float]]]:
+        return await self._shard(user_id).user_entries(user_id)
+
+    async def clean_old(self, expiry_time: int) -> int:
+        # Файлы очищаются параллельно, каждый под своей блокировкой
+        return sum(await asyncio.gather(*[shard.clean_old(expiry_time) for shard in self.shards]))
@@ -0,0 +1,65 @@
+from typing import Any, AsyncIterable, Awaitable, Callable, List, Optional, Sequence, Tuple, Union
+
+
+class PageSource:
+    """
+          Источник элементов для create_buttons: отдает только запрошенную страницу и общее количество.
+    """
+
+    async def fetch(self, offset: int, limit: int) -> Tuple[Sequence[Any], int]:
+        raise NotImplementedError
+
+
+class ListSource(PageSource):
+    def __init__(self, objects: Sequence[Any]):
+        self.objects = objects
+
+    async def fetch(self, offset: int, limit: int) -> Tuple[Sequence[Any], int]:
+        return self.objects[offset:offset + limit], len(self.objects)
+
+
+class CallableSource(PageSource):
+    def __init__(self, func: Callable[[int, int], Awaitable[Tuple[Sequence[Any], int]]]):
+        """
+              :param func: async функция (offset, limit) -> (элементы страницы, общее количество).
+        """
+        self.func = func
+
+    async def fetch(self, offset: int, limit: int) -> Tuple[Sequence[Any], int]:
+        return await self.func(offset, limit)
+
+
+class AsyncIterableSource(PageSource):
+    def __init__(self, iterable: AsyncIterable[Any], total: Optional[int] = None):
+        """
+              :param iterable: Асинхронный итератор по элементам.
+              :param total: Общее количество элементов; по умолчанию берется len(iterable).
+        """
+        self.iterable = iterable
+        self.total = len(iterable) if total is None else total
+
+    async def fetch(self, offset: int, limit: int) -> Tuple[Sequence[Any], int]:
+        # Элементы до offset пропускаются без сохранения, после страницы итерация прекращается
+        items: List[Any] = []
+        index = 0
+        async for item in self.iterable:
+            if index >= offset:
+                items.append(item)
+                if len(items) >= limit:
+                    break
+            index += 1
+        return items, self.total
+
+
+def as_page_source(
+        objects: Union[PageSource, Sequence[Any], AsyncIterable[Any], Callable[[int, int], Awaitable]]
+) -> PageSource:
+    if isinstance(objects, PageSource):
+        return objects
+    if hasattr(objects, '__aiter__'):
+        return AsyncIterableSource(objects)
+    if callable(objects):
+        return CallableSource(objects)
+    if hasattr(objects, '__getitem__') and hasattr(objects, '__len__'):
+        return ListSource(objects)
+    raise TypeError("Not implemented type")
@@ -0,0 +1,71 @@
+"""
+Отдельный процесс с общим хранилищем SQLite для нескольких процессов бота.
+
+    python -m aiogram_callback_manager.storage_server --db callback_data.db --unix /run/bot/callback.sock
+    CALLBACK_STORAGE_SECRET=... python -m aiogram_callback_manager.storage_server --db callback_data.db --port 8765
+
+Процессы бота подключаются к нему через RemoteStorage. Без --unix сервер слушает только 127.0.0.1
+и требует общий секрет из CALLBACK_STORAGE_SECRET или --secret-file.
+"""
+import argparse
+import asyncio
+import os
+from typing import Optional
+
+from .base_db_storage import SQLiteStorage
+from .remote_storage import DEFAULT_MAX_FRAME_SIZE, Address, StorageServer
+
+SECRET_ENV = "CALLBACK_STORAGE_SECRET"
+
+
+def _parse_address(args) -> Address:
+    if args.unix:
+        return args.unix
+    return args.host, args.port
+
+
+def _read_secret(args) -> Optional[bytes]:
+    if args.secret_file:
+        with open(args.secret_file, "rb") as file:
+            return file.read().strip() or None
+    secret = os.environ.get(SECRET_ENV)
+    return secret.encode() if secret else None
+
+
+async def _serve(args):
+    storage = SQLiteStorage(args.db, group_commit=True, journal_mode="WAL", synchronous="NORMAL",
+                            read_connections=args.read_connections, schema=args.schema, user_index=args.user_index)
+    server = StorageServer(storage, _parse_address(args), secret=args.secret,
+                           max_frame_size=args.max_frame_size)
+    await server.start()
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="callback_data.db", help="Файл SQLite")
+    parser.add_argument("--unix", help="Путь к Unix-сокету")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--read-connections", type=int, default=4, help="Соединений SQLite для чтения")
+    parser.add_argument("--schema", type=int, default=1, choices=[1, 2], help="Версия схемы SQLite")
+    parser.add_argument("--user-index", action="store_true",
+                        help="Индекс по user_id: нужен клиентам, которые используют QuotaStorage")
+    parser.add_argument("--secret-file", help=f"Файл с общим секретом; по умолчанию берется из {SECRET_ENV}")
+    parser.add_argument("--max-frame-size", type=int, default=DEFAULT_MAX_FRAME_SIZE,
+                        help="Максимальный размер запроса в байтах")
+    args = parser.parse_args()
+    args.secret = _read_secret(args)
+    if not args.unix and not args.secret:
+        parser.error(f"TCP requires a shared secret: set {SECRET_ENV} or pass --secret-file")
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
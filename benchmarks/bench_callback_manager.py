@@ -0,0 +1,307 @@
+"""
+Бенчмарки горячих путей AsyncCallbackManager без сети и Telegram.
+
+    python benchmarks/bench_callback_manager.py --output results.json
+    python benchmarks/bench_callback_manager.py --quick --compare results.json
+
+Результаты сохраняются в JSON, --compare печатает отношение к предыдущему запуску.
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from importlib.metadata import version, PackageNotFoundError
+from typing import Any, Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram_callback_manager import (  # noqa: E402
+    AsyncCallbackManager, CallbackRecord, CompactSerializer, JsonSerializer, MemoryStorage, PickleSerializer,
+    SQLiteStorage, ShardedSQLiteStorage,
+)
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeCallbackQuery:
+    """
+          Минимальная замена CallbackQuery: main_callback_handler использует только data, from_user и answer.
+    """
+
+    def __init__(self, data: str, user_id: int):
+        self.data = data
+        self.from_user = FakeUser(user_id)
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+
+@dataclasses.dataclass
+class Product:
+    id: int
+    name: str
+    price: int
+    tags: List[str]
+
+
+def _products(count: int) -> List[Product]:
+    return [Product(i, f"Товар {i}", i * 100, ["new", "sale"]) for i in range(count)]
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_us": statistics.fmean(ordered) * 1e6,
+        "p50_us": ordered[len(ordered) // 2] * 1e6,
+        "p99_us": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6,
+        "max_us": ordered[-1] * 1e6,
+    }
+
+
+async def _measure(func: Callable[[], Awaitable[Any]], repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - started)
+    return _stats(samples)
+
+
+def _storages(directory: str) -> Dict[str, Callable[[], Any]]:
+    return {
+        "sqlite": lambda: SQLiteStorage(os.path.join(directory, f"sqlite_{time.monotonic_ns()}.db")),
+        "sqlite_wal": lambda: SQLiteStorage(
+            os.path.join(directory, f"wal_{time.monotonic_ns()}.db"),
+            journal_mode="WAL", synchronous="NORMAL", read_connections=4
+        ),
+        "sqlite_v2": lambda: SQLiteStorage(
+            os.path.join(directory, f"v2_{time.monotonic_ns()}.db"),
+            journal_mode="WAL", synchronous="NORMAL", read_connections=4, schema=2
+        ),
+        "sharded": lambda: ShardedSQLiteStorage(
+            os.path.join(directory, f"sharded_{time.monotonic_ns()}_{{shard}}.db"),
+            shards=4, journal_mode="WAL", synchronous="NORMAL"
+        ),
+        "memory": lambda: MemoryStorage(),
+    }
+
+
+def _make_manager(storage) -> AsyncCallbackManager:
+    manager = AsyncCallbackManager(storage=storage)
+
+    async def product_list(callback_query, page: int = 1, back_btn=None):
+        pass
+
+    async def product_detail(callback_query, element: Product, back_btn=None):
+        pass
+
+    manager.register_handler(product_list)
+    manager.register_handler(product_detail)
+    manager.bench_handlers = (product_list, product_detail)
+    return manager
+
+
+async def _prefill(storage, rows: int, created_at: float):
+    batch = 5000
+    for start in range(0, rows, batch):
+        await storage.save_many([
+            CallbackRecord(f"prefill{index:032d}", b"x" * 200, created_at, index % 1000)
+            for index in range(start, min(rows, start + batch))
+        ])
+
+
+def bench_storage(loop: asyncio.AbstractEventLoop, name: str, factory: Callable[[], Any], args) -> Dict[str, Any]:
+    results = {}
+    products = _products(1000)
+    loop.run_until_complete(_bench_cold_start(factory, results))
+    loop.run_until_complete(_bench_hot_paths(_make_manager(factory()), products, results, args))
+
+    # Задержка нажатия и очистка в зависимости от размера базы
+    for rows in args.db_sizes:
+        loop.run_until_complete(_bench_db_size(_make_manager(factory()), products, rows, results, args))
+
+    return {f"{name}.{key}": value for key, value in results.items()}
+
+
+async def _bench_cold_start(factory: Callable[[], Any], results: Dict[str, Any]):
+    # Создание менеджера не трогает хранилище, оно открывается при первом сохранении
+    started = time.perf_counter()
+    manager = _make_manager(factory())
+    results["manager_init"] = {"seconds": time.perf_counter() - started}
+
+    product_list, product_detail = manager.bench_handlers
+    started = time.perf_counter()
+    await manager.create_button("Товар", product_detail, 1, None, element=None)
+    results["first_button"] = {"seconds": time.perf_counter() - started}
+    await manager.close()
+
+
+async def _bench_hot_paths(manager: AsyncCallbackManager, products: List[Product], results: Dict[str, Any], args):
+    product_list, product_detail = manager.bench_handlers
+
+    results["create_button"] = await _measure(
+        lambda: manager.create_button("Товар", product_detail, 1, None, element=products[0]), args.repeat
+    )
+    page = iter(range(10 ** 9))
+    results["create_buttons_page10"] = await _measure(
+        lambda: manager.create_buttons(products, product_list, product_detail, 1,
+                                       objects_per_page=10, page=next(page) % 100 + 1),
+        args.repeat
+    )
+
+    button = await manager.create_button("Товар", product_detail, 1, None, element=products[0])
+    query = FakeCallbackQuery(button.callback_data, 1)
+    results["click_dispatch"] = await _measure(lambda: manager.main_callback_handler(query), args.repeat)
+
+    # Пропускная способность нажатий при разной конкурентности
+    for concurrency in args.concurrency:
+        total = max(args.repeat, concurrency * 10)
+
+        async def worker(count: int):
+            for _ in range(count):
+                await manager.main_callback_handler(query)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(total // concurrency) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        results[f"click_throughput_c{concurrency}"] = {"ops_per_s": (total // concurrency) * concurrency / elapsed}
+
+    await manager.close()
+
+
+async def _bench_db_size(
+        manager: AsyncCallbackManager,
+        products: List[Product],
+        rows: int,
+        results: Dict[str, Any],
+        args
+):
+    product_list, product_detail = manager.bench_handlers
+    await manager.start()
+    await _prefill(manager.storage, rows, time.time() - 7200)
+    button = await manager.create_button("Товар", product_detail, 1, None, element=products[0])
+    query = FakeCallbackQuery(button.callback_data, 1)
+    results[f"click_dispatch_rows{rows}"] = await _measure(
+        lambda: manager.main_callback_handler(query), args.repeat
+    )
+
+    started = time.perf_counter()
+    await manager.clean_old_callback_data(3600)
+    results[f"clean_old_rows{rows}"] = {"seconds": time.perf_counter() - started}
+    await manager.close()
+
+
+def bench_serializers(args) -> Dict[str, Any]:
+    results = {}
+    product = _products(1)[0]
+    data = {
+        'handler_id': "0" * 32,
+        'args': [],
+        'kwargs': {'element': dataclasses.asdict(product), 'page': 3},
+        'back_btn': "cb_" + "0" * 32,
+    }
+    # JSON не умеет dataclass, поэтому он измеряется только со словарем
+    dataclass_data = dict(data, kwargs={'element': product, 'page': 3})
+    for name, serializer, payload in (
+            ("pickle", PickleSerializer(), data), ("json", JsonSerializer(), data),
+            ("compact", CompactSerializer(), data),
+            ("pickle_dataclass", PickleSerializer(), dataclass_data),
+            ("compact_dataclass", CompactSerializer(), dataclass_data),
+    ):
+        data_bytes = serializer.dumps(payload)
+        dumps, loads = [], []
+        for _ in range(args.repeat * 10):
+            started = time.perf_counter()
+            serializer.dumps(payload)
+            dumps.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            serializer.loads(data_bytes)
+            loads.append(time.perf_counter() - started)
+        results[f"serializer.{name}.dumps"] = _stats(dumps)
+        results[f"serializer.{name}.loads"] = _stats(loads)
+        results[f"serializer.{name}.size"] = {"bytes": len(data_bytes)}
+    return results
+
+
+def _package_version(name: str) -> str:
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]):
+    print(f"{'benchmark':60} {'metric':12} {'previous':>12} {'current':>12} {'ratio':>8}")
+    for name, metrics in current["results"].items():
+        old = previous["results"].get(name)
+        if old is None:
+            continue
+        for metric, value in metrics.items():
+            if metric == "count" or metric not in old or not old[metric]:
+                continue
+            print(f"{name:60} {metric:12} {old[metric]:12.2f} {value:12.2f} {value / old[metric]:8.2f}")
+
+
+def run(loop: asyncio.AbstractEventLoop, args) -> Dict[str, Any]:
+    results = bench_serializers(args)
+    with tempfile.TemporaryDirectory() as directory:
+        for name, factory in _storages(directory).items():
+            if args.storage and name not in args.storage:
+                continue
+            results.update(bench_storage(loop, name, factory, args))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Файл для результатов в JSON")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для сравнения")
+    parser.add_argument("--repeat", type=int, default=200, help="Количество повторов каждого замера")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--db-sizes", type=int, nargs="+", default=[0, 10_000, 100_000])
+    parser.add_argument("--storage", nargs="+", help="Только указанные хранилища: sqlite, sqlite_wal, sqlite_v2, sharded, memory")
+    parser.add_argument("--quick", action="store_true", help="Короткий прогон для проверки")
+    args = parser.parse_args()
+    if args.quick:
+        args.repeat = 20
+        args.db_sizes = [0, 1000]
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "aiogram": _package_version("aiogram"),
+            "aiosqlite": _package_version("aiosqlite"),
+            "repeat": args.repeat,
+        },
+        "results": run(loop, args),
+    }
+    loop.close()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            compare(report, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
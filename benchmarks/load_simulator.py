@@ -0,0 +1,271 @@
+"""
+Нагрузочный симулятор: тысячи пользователей нажимают кнопки бота через aiogram Dispatcher без сети.
+
+    python benchmarks/load_simulator.py --users 2000 --clicks 20 --storage sqlite_wal memory
+    python benchmarks/load_simulator.py --scenario browse --output load.json
+
+Запросы к Telegram перехватывает FakeSession: клавиатура из ответа бота запоминается,
+и следующий клик пользователь делает по ней. Для каждого сценария и хранилища печатаются
+пропускная способность, p50/p99 обработки нажатия и рост хранилища.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher, types  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.filters import Command  # noqa: E402
+from aiogram.methods import AnswerCallbackQuery, EditMessageReplyMarkup, EditMessageText, SendMessage  # noqa: E402
+from aiogram.methods.base import TelegramMethod  # noqa: E402
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+from aiogram_callback_manager import AsyncCallbackManager  # noqa: E402
+from bench_callback_manager import Product, _products, _storages  # noqa: E402
+
+# Веса типов кнопок: page — номера страниц, item — элементы списка, back — «Назад», menu — разделы меню
+SCENARIOS = {
+    "browse": {"page": 8, "item": 1, "back": 1, "menu": 1},
+    "detail": {"page": 1, "item": 6, "back": 5, "menu": 1},
+    "mixed": {"page": 3, "item": 3, "back": 3, "menu": 2},
+}
+
+
+class FakeSession(BaseSession):
+    """
+          Сессия Bot без сети: отвечает на методы, которыми пользуется бот,
+          и запоминает последнюю клавиатуру в каждом чате.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.keyboards: Dict[int, List[List[InlineKeyboardButton]]] = {}
+        self.requests = 0
+        self._message_id = 0
+
+    def _remember(self, chat_id: Optional[int], markup: Optional[InlineKeyboardMarkup]):
+        if chat_id is not None and isinstance(markup, InlineKeyboardMarkup):
+            self.keyboards[chat_id] = markup.inline_keyboard
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.requests += 1
+        if isinstance(method, AnswerCallbackQuery):
+            return True
+        if isinstance(method, (EditMessageText, EditMessageReplyMarkup)):
+            self._remember(method.chat_id, method.reply_markup)
+            return True
+        if isinstance(method, SendMessage):
+            self._remember(method.chat_id, method.reply_markup)
+            self._message_id += 1
+            return types.Message.model_validate({
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": method.chat_id, "type": "private"},
+                "text": method.text,
+            }, context={"bot": bot})
+        raise NotImplementedError(f"FakeSession does not support {type(method).__name__}")
+
+    async def stream_content(self, *args, **kwargs) -> AsyncGenerator[bytes, None]:
+        raise NotImplementedError
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def build_bot(manager: AsyncCallbackManager, products: List[Product]) -> Dispatcher:
+    """
+          Бот из примеров: меню, каталог с пагинацией, карточка товара и кнопки «Назад».
+    """
+    dp = Dispatcher()
+    dp.include_router(manager.router)
+
+    async def menu_keyboard(user_data) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup(inline_keyboard=[
+            [await manager.create_button("Каталог", catalog, user_data)],
+            [await manager.create_button("Профиль", profile, user_data)],
+        ])
+
+    @dp.message(Command('start'))
+    async def start(message: types.Message):
+        await message.answer("Меню", reply_markup=await menu_keyboard(message))
+
+    async def menu(callback_query: types.CallbackQuery):
+        await callback_query.message.edit_text("Меню", reply_markup=await menu_keyboard(callback_query))
+
+    async def catalog(callback_query: types.CallbackQuery, page: int = 1, back_btn=None):
+        rows = await manager.create_buttons(products, catalog, product, callback_query,
+                                            page=page, back_btn=callback_query)
+        rows.append([await manager.create_button("Назад", menu, callback_query)])
+        await callback_query.message.edit_text(f"Каталог, страница {page}",
+                                               reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+
+    async def product(callback_query: types.CallbackQuery, element: Product, back_btn=None):
+        rows = [[await manager.create_button("Купить", buy, callback_query, callback_query, element=element)]]
+        if back_btn:
+            rows.append([back_btn])
+        await callback_query.message.edit_text(f"{element.name}: {element.price}",
+                                               reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+
+    async def buy(callback_query: types.CallbackQuery, element: Product, back_btn=None):
+        await callback_query.answer(f"{element.name} в корзине")
+
+    async def profile(callback_query: types.CallbackQuery, back_btn=None):
+        keyboard = [[await manager.create_button("Назад", menu, callback_query)]]
+        await callback_query.message.edit_text("Профиль", reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard))
+
+    for handler in (menu, catalog, product, buy, profile):
+        manager.register_handler(handler)
+    return dp
+
+
+def _button_kind(button: InlineKeyboardButton) -> str:
+    if button.text.isdigit():
+        return "page"
+    if button.text == "Назад":
+        return "back"
+    if button.text.startswith("Товар"):
+        return "item"
+    return "menu"
+
+
+class Simulation:
+    def __init__(self, dp: Dispatcher, bot: Bot, session: FakeSession, weights: Dict[str, int], seed: int):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.weights = weights
+        self.random = random.Random(seed)
+        self.latencies: List[float] = []
+        self.errors = 0
+        self._update_id = 0
+
+    def _update(self, user_id: int, **payload) -> types.Update:
+        self._update_id += 1
+        return types.Update.model_validate({"update_id": self._update_id, **payload}, context={"bot": self.bot})
+
+    async def _feed(self, update: types.Update):
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            self.errors += 1
+        self.latencies.append(time.perf_counter() - started)
+
+    def _message(self, user_id: int, text: Optional[str] = None) -> Dict[str, Any]:
+        user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+        message = {"message_id": 1, "date": int(time.time()), "chat": {"id": user_id, "type": "private"},
+                   "from": user, "text": text or "Меню"}
+        return message
+
+    async def user(self, user_id: int, clicks: int, think_time: float):
+        await self._feed(self._update(user_id, message=self._message(user_id, "/start")))
+        for number in range(clicks):
+            buttons = [
+                button for row in self.session.keyboards.get(user_id, ())
+                for button in row if button.callback_data and button.callback_data != "noop"
+            ]
+            if not buttons:
+                return
+            kinds = [_button_kind(button) for button in buttons]
+            button = self.random.choices(buttons, [self.weights.get(kind, 1) for kind in kinds])[0]
+            await self._feed(self._update(user_id, callback_query={
+                "id": f"{user_id}:{number}",
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+                "chat_instance": str(user_id),
+                "message": self._message(user_id),
+                "data": button.callback_data,
+            }))
+            if think_time:
+                await asyncio.sleep(self.random.uniform(0, think_time))
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_scenario(name: str, storage_factory, args) -> Dict[str, Any]:
+    manager = AsyncCallbackManager(
+        storage=storage_factory(),
+        snapshot_lists=args.snapshot_lists,
+        parametric_pagination=args.parametric_pagination,
+    )
+    session = FakeSession()
+    bot = Bot(token="42:TEST", session=session)
+    dp = build_bot(manager, _products(args.products))
+    simulation = Simulation(dp, bot, session, SCENARIOS[name], args.seed)
+
+    await dp.emit_startup()
+    before = await manager.storage.stats()
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        simulation.user(user_id, args.clicks, args.think_time) for user_id in range(1, args.users + 1)
+    ])
+    elapsed = time.perf_counter() - started
+    after = await manager.storage.stats()
+    await dp.emit_shutdown()
+
+    ordered = sorted(simulation.latencies)
+    return {
+        "updates": len(ordered),
+        "errors": simulation.errors,
+        "seconds": elapsed,
+        "updates_per_s": len(ordered) / elapsed,
+        "mean_ms": statistics.fmean(ordered) * 1e3,
+        "p50_ms": _percentile(ordered, 0.5) * 1e3,
+        "p99_ms": _percentile(ordered, 0.99) * 1e3,
+        "telegram_requests": session.requests,
+        "rows_added": after.get('rows', 0) - before.get('rows', 0),
+        "bytes_added": after.get('size_bytes', 0) - before.get('size_bytes', 0),
+        "rows_per_update": (after.get('rows', 0) - before.get('rows', 0)) / max(1, len(ordered)),
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for storage_name, factory in _storages(directory).items():
+            if args.storage and storage_name not in args.storage:
+                continue
+            for scenario in args.scenario:
+                key = f"{storage_name}.{scenario}"
+                results[key] = result = await run_scenario(scenario, factory, args)
+                print(f"{key:28} {result['updates_per_s']:10.0f} upd/s  p50 {result['p50_ms']:7.2f} ms  "
+                      f"p99 {result['p99_ms']:7.2f} ms  +{result['rows_added']} rows  "
+                      f"+{result['bytes_added'] / 1024:.0f} KiB  errors {result['errors']}", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="Количество одновременных пользователей")
+    parser.add_argument("--clicks", type=int, default=20, help="Нажатий на пользователя")
+    parser.add_argument("--think-time", type=float, default=0, help="Максимальная пауза между нажатиями (сек)")
+    parser.add_argument("--products", type=int, default=200, help="Размер каталога")
+    parser.add_argument("--scenario", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--storage", nargs="+", help="Только указанные хранилища из bench_callback_manager")
+    parser.add_argument("--snapshot-lists", action="store_true")
+    parser.add_argument("--parametric-pagination", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Файл для результатов в JSON")
+    args = parser.parse_args()
+
+    report = {"args": vars(args), "results": asyncio.run(run(args))}
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
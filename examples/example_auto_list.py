@@ -12,7 +12,6 @@ bot = Bot(token=API_TOKEN)
 dp = Dispatcher()
 callback_manager = AsyncCallbackManager(use_json=False)
 dp.include_router(callback_manager.router)
-asyncio.get_event_loop().run_until_complete(callback_manager.init_db())
 
 class Product:
     def __init__(self, name: str, price: int):
@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+from typing import Any, List, Tuple
+
+import pytest
+
+
+class FakeCallbackQuery:
+    """
+          Минимальная замена CallbackQuery: данные кнопки, пользователь и записанные ответы.
+    """
+
+    def __init__(self, data: str, user_id: int = 1):
+        self.data = data
+        self.from_user = SimpleNamespace(id=user_id)
+        self.answers: List[Tuple[Any, dict]] = []
+
+    async def answer(self, text: Any = None, **kwargs):
+        self.answers.append((text, kwargs))
+
+
+@pytest.fixture
+def click():
+    """
+          Нажатие кнопки: click(manager, button, user_id) возвращает FakeCallbackQuery с ответами.
+    """
+
+    async def click(manager, button, user_id: int = 1) -> FakeCallbackQuery:
+        query = FakeCallbackQuery(button.callback_data, user_id)
+        await manager.main_callback_handler(query)
+        return query
+
+    return click
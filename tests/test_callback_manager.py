@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from aiogram_callback_manager import AsyncCallbackManager, CallbackDataStorage, MemoryStorage
+
+
+class DictStorage(CallbackDataStorage):
+    # Хранилище, написанное до появления expires_at: save принимает 4 аргумента
+    def __init__(self):
+        self.data = {}
+
+    async def save(self, data_hash, data_bytes, timestamp, user_id):
+        self.data[(data_hash, user_id)] = data_bytes
+
+    async def load(self, data_hash, user_id):
+        return self.data.get((data_hash, user_id))
+
+    async def clean_old(self, expiry_time):
+        pass
+
+    async def init_db(self):
+        pass
+
+
+def test_button_ttl_is_not_passed_to_handler(click):
+    async def scenario():
+        storage = MemoryStorage()
+        manager = AsyncCallbackManager(storage=storage)
+        received = {}
+
+        async def handler(callback_query, ttl=None):
+            received['ttl'] = ttl
+
+        manager.register_handler(handler)
+        button = await manager.create_button("ttl", handler, 1, None, ttl=30, button_ttl=60)
+        record = next(iter(storage._data.values()))
+        assert record.expires_at is not None and record.expires_at - time.time() <= 60
+        await click(manager, button)
+        assert received == {'ttl': 30}
+        await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_storage_without_expires_at(click):
+    async def scenario():
+        manager = AsyncCallbackManager(storage=DictStorage())
+        received = []
+
+        async def handler(callback_query, item=None, element=None, page=None):
+            received.append(item or element)
+
+        manager.register_handler(handler)
+        button = await manager.create_button("one", handler, 1, None, item="one")
+        buttons = await manager.create_buttons(["a", "b"], handler, handler, 1)
+        await click(manager, button)
+        await click(manager, buttons[1][0])
+        assert received == ["one", "b"]
+        await manager.close()
+
+    asyncio.run(scenario())
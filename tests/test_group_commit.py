@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from aiogram_callback_manager import CallbackRecord, SQLiteStorage
+
+
+def _record(index: int, user_id: int = 1) -> CallbackRecord:
+    return CallbackRecord(f"hash{index}", f"data{index}".encode(), time.time(), user_id)
+
+
+def test_load_sees_buffered_records(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "db.sqlite"), group_commit=True, commit_delay=60)
+        await storage.init_db()
+        try:
+            save = asyncio.create_task(storage.save_many([_record(1)]))
+            await asyncio.sleep(0)
+            assert await storage.load("hash1", 1) == b"data1"
+            assert await storage.load("hash1", 2) is None
+            await storage.flush()
+            await save
+            assert await storage.load("hash1", 1) == b"data1"
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_load_sees_batches_waiting_for_previous_commit(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "db.sqlite"), group_commit=True, commit_max_rows=1,
+                                journal_mode="WAL", read_connections=2)
+        await storage.init_db()
+        try:
+            # Каждая запись сразу уходит отдельной пачкой; вторая ждет, пока пишется первая
+            saves = [asyncio.create_task(storage.save_many([_record(index)])) for index in range(5)]
+            await asyncio.sleep(0)
+            loaded = await asyncio.gather(*[storage.load(f"hash{index}", 1) for index in range(5)])
+            assert loaded == [f"data{index}".encode() for index in range(5)]
+            await asyncio.gather(*saves)
+            assert not storage._flushing
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_saves_share_one_commit(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "db.sqlite"), group_commit=True)
+        await storage.init_db()
+        commits = 0
+        commit = storage.connection.commit
+
+        async def counting_commit():
+            nonlocal commits
+            commits += 1
+            await commit()
+
+        storage.connection.commit = counting_commit
+        try:
+            await asyncio.gather(*[storage.save_many([_record(index, user_id=index)]) for index in range(50)])
+            assert commits == 1
+            assert (await storage.stats())["rows"] == 50
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from aiogram_callback_manager import AsyncCallbackManager, MemoryStorage
+from aiogram_callback_manager.inline_data import INLINE_PREFIX, decode_inline, encode_inline
+from aiogram_callback_manager.messages import MockMessage
+
+
+def _manager(**options) -> AsyncCallbackManager:
+    return AsyncCallbackManager(storage=MemoryStorage(), inline_callback_data=True, hash_key=b"secret", **options)
+
+
+def test_encode_decode_round_trip():
+    callback_data = encode_inline(b"\x01\x02\x03\x04", [1, "a", None], {3: True, 255: "back"}, 111)
+    assert callback_data.startswith(INLINE_PREFIX)
+    assert decode_inline(callback_data, 4, 111) == (b"\x01\x02\x03\x04", [1, "a", None], {3: True, 255: "back"})
+    with pytest.raises(ValueError):
+        decode_inline(callback_data, 4, 999)
+
+
+def test_keyed_tag_rejects_tampering():
+    callback_data = encode_inline(b"\x01\x02\x03\x04", [7], {}, 111, key=b"secret")
+    with pytest.raises(ValueError):
+        decode_inline(callback_data, 4, 111)
+    with pytest.raises(ValueError):
+        decode_inline(callback_data, 4, 111, key=b"other")
+    assert decode_inline(callback_data, 4, 111, key=b"secret")[1] == [7]
+
+
+def test_inline_data_requires_hash_key():
+    with pytest.raises(ValueError):
+        AsyncCallbackManager(storage=MemoryStorage(), inline_callback_data=True)
+
+
+def test_forged_payload_is_rejected(click):
+    async def scenario():
+        manager = _manager()
+        calls = []
+
+        async def delete_order(callback_query, order_id: int):
+            calls.append(order_id)
+
+        manager.register_handler(delete_order)
+        handler = manager._handlers[manager._generate_handler_id(delete_order)]
+        # Клиент знает имя и параметры обработчика, но не hash_key
+        for key in (None, b"guess"):
+            forged = SimpleNamespace(callback_data=encode_inline(handler.inline_id, [13], {}, 999, key))
+            query = await click(manager, forged, user_id=999)
+            assert query.answers == [(MockMessage.DataInvalid, {'show_alert': True})]
+        assert calls == []
+
+    asyncio.run(scenario())
+
+
+def test_button_runs_only_for_its_user(click):
+    async def scenario():
+        manager = _manager()
+        calls = []
+
+        async def open_order(callback_query, order_id: int):
+            calls.append((callback_query.from_user.id, order_id))
+
+        manager.register_handler(open_order)
+        button = await manager.create_button("Заказ", open_order, 111, None, order_id=42)
+        assert button.callback_data.startswith(INLINE_PREFIX)
+
+        stranger = await click(manager, button, user_id=999)
+        assert stranger.answers == [(MockMessage.DataInvalid, {'show_alert': True})]
+        assert calls == []
+
+        await click(manager, button, user_id=111)
+        assert calls == [(111, 42)]
+
+    asyncio.run(scenario())
+
+
+def test_signature_change_invalidates_old_buttons(click):
+    async def scenario():
+        old = _manager()
+
+        async def open_order(callback_query, order_id: int = None, user_id: int = None):
+            pass
+
+        old.register_handler(open_order)
+        button = await old.create_button("Заказ", open_order, 111, None, order_id=42)
+
+        # Новая версия бота: те же имена, другой порядок параметров
+        new = _manager()
+        calls = []
+
+        async def open_order(callback_query, user_id: int = None, order_id: int = None):  # noqa: F811
+            calls.append((user_id, order_id))
+
+        new.register_handler(open_order)
+        query = await click(new, button, user_id=111)
+        assert calls == []
+        assert query.answers == [(MockMessage.DataInvalid, {'show_alert': True})]
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from aiogram_callback_manager import CallbackRecord, SQLiteStorage
+
+
+def _counting(storage: SQLiteStorage) -> list:
+    # Пачки, дошедшие до записи в базу
+    written = []
+    write = storage._write
+
+    async def counting_write(records, *args, **kwargs):
+        written.append(len(records))
+        return await write(records, *args, **kwargs)
+
+    storage._write = counting_write
+    return written
+
+
+def test_repeated_save_is_skipped_until_refresh(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "db.sqlite"), known_entries=100, known_refresh=60)
+        await storage.init_db()
+        written = _counting(storage)
+        now = time.time()
+        try:
+            await storage.save_many([CallbackRecord("menu", b"data", now, 1)])
+            await storage.save_many([CallbackRecord("menu", b"data", now + 1, 1)])
+            # Другой пользователь — другая запись
+            await storage.save_many([CallbackRecord("menu", b"data", now + 1, 2)])
+            assert written == [1, 1]
+            await storage.save_many([CallbackRecord("menu", b"data", now + 61, 1)])
+            assert written == [1, 1, 1]
+            assert await storage.load("menu", 1) == b"data"
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_expired_known_entry_is_saved_again(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "db.sqlite"), known_entries=100, known_refresh=60)
+        await storage.init_db()
+        try:
+            now = time.time()
+            await storage.save_many([CallbackRecord("menu", b"data", now - 2, 1, now - 1)])
+            assert await storage.load("menu", 1) is None
+            # Клавиатура показана снова после истечения button_ttl, но раньше known_refresh
+            await storage.save_many([CallbackRecord("menu", b"data", now, 1, now + 1)])
+            assert await storage.load("menu", 1) == b"data"
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
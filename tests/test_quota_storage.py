@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+from aiogram_callback_manager import CachedStorage, CallbackRecord, QuotaStorage, ShardedSQLiteStorage, SQLiteStorage
+
+
+def _record(name: str, user_id: int, size: int = 10) -> CallbackRecord:
+    return CallbackRecord(name, b"x" * size, time.time(), user_id)
+
+
+def _quota(tmp_path, **options) -> QuotaStorage:
+    return QuotaStorage(SQLiteStorage(str(tmp_path / "db.sqlite")), **options)
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    async def scenario():
+        storage = _quota(tmp_path, max_entries_per_user=3)
+        await storage.init_db()
+        try:
+            await storage.save_many([_record(f"old{index}", 1) for index in range(3)])
+            assert await storage.load("old0", 1) is not None  # old0 снова используется
+            await storage.save_many([_record("new0", 1), _record("new1", 1)])
+
+            hashes = {entry[0] for entry in await storage.user_entries(1)}
+            assert hashes == {"old0", "new0", "new1"}
+            assert storage.evicted == 2
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_current_batch_is_never_evicted(tmp_path):
+    async def scenario():
+        storage = _quota(tmp_path, max_bytes_per_user=25)
+        await storage.init_db()
+        try:
+            await storage.save_many([_record(f"page{index}", 1) for index in range(5)])
+            assert len(await storage.user_entries(1)) == 5
+            await storage.save_many([_record("next", 1)])
+            assert {entry[0] for entry in await storage.user_entries(1)} == {"page4", "next"}
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_tracker_is_bounded_and_rehydrated(tmp_path):
+    async def scenario():
+        storage = _quota(tmp_path, max_entries_per_user=3, max_tracked_users=2)
+        await storage.init_db()
+        try:
+            await storage.save_many([_record(f"a{index}", 1) for index in range(3)])
+            for user_id in (2, 3):
+                await storage.save_many([_record("b", user_id)])
+            assert list(storage._users) == [2, 3]
+
+            # Учет пользователя 1 вытеснен из памяти и перечитывается из хранилища, квота соблюдается
+            await storage.save_many([_record("a3", 1)])
+            assert list(storage._users) == [3, 1]
+            assert {entry[0] for entry in await storage.user_entries(1)} == {"a1", "a2", "a3"}
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_rejects_non_positive_tracker_size(tmp_path):
+    with pytest.raises(ValueError):
+        _quota(tmp_path, max_tracked_users=0)
+
+
+def test_user_index_is_enabled(tmp_path):
+    async def scenario():
+        sharded = ShardedSQLiteStorage(str(tmp_path / "db_{shard}.sqlite"), shards=2)
+        storage = QuotaStorage(CachedStorage(sharded), max_entries_per_user=3)
+        await storage.init_db()
+        try:
+            for shard in sharded.shards:
+                async with shard.connection.execute(
+                        "EXPLAIN QUERY PLAN SELECT hash FROM callback_access WHERE user_id = ?", (1,)
+                ) as cursor:
+                    plan = " ".join(row[-1] for row in await cursor.fetchall())
+                assert "callback_access_user" in plan
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
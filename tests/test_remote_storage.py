@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+import pytest
+
+from aiogram_callback_manager import CallbackRecord, MemoryStorage, RemoteStorage, RemoteStorageError, StorageServer
+from aiogram_callback_manager.remote_storage import _HEADER, _LOAD_MANY
+
+
+class SlowStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.started = asyncio.Event()
+
+    async def load(self, data_hash: str, user_id: int):
+        self.started.set()
+        await self.release.wait()
+        return await super().load(data_hash, user_id)
+
+
+def _record(index: int, user_id: int = 1) -> CallbackRecord:
+    return CallbackRecord(f"hash{index}", f"data{index}".encode(), time.time(), user_id)
+
+
+def test_save_and_load_batch(tmp_path):
+    async def scenario():
+        server = StorageServer(MemoryStorage(), str(tmp_path / "storage.sock"))
+        await server.start()
+        client = RemoteStorage(server.address, pool_size=2)
+        try:
+            await asyncio.gather(*[client.save_many([_record(index)]) for index in range(20)])
+            loaded = await asyncio.gather(*[client.load(f"hash{index}", 1) for index in range(20)])
+            assert loaded == [f"data{index}".encode() for index in range(20)]
+            assert await client.load("hash1", 2) is None
+            assert await client.delete_many([("hash1", 1)]) == 1
+            assert await client.load("hash1", 1) is None
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_unknown_opcode_keeps_connection(tmp_path):
+    async def scenario():
+        server = StorageServer(MemoryStorage(), str(tmp_path / "storage.sock"))
+        await server.start()
+        client = RemoteStorage(server.address, pool_size=1)
+        try:
+            with pytest.raises(RemoteStorageError, match="unknown opcode"):
+                await client._request(99)
+            await client.save_many([_record(1)])
+            assert await client.load("hash1", 1) == b"data1"
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_server_restart_with_requests_in_flight(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "storage.sock")
+        storage = SlowStorage()
+        server = StorageServer(storage, path)
+        await server.start()
+        client = RemoteStorage(path, pool_size=1)
+        try:
+            await client.save_many([_record(1)])
+            loads = [asyncio.create_task(client.load(f"hash{index}", 1)) for index in range(3)]
+            await storage.started.wait()
+            # Сервер закрывает соединения, не дожидаясь ответов на начатые запросы
+            closing = asyncio.create_task(server.close())
+            results = await asyncio.gather(*loads, return_exceptions=True)
+            assert all(isinstance(result, RemoteStorageError) for result in results)
+            storage.release.set()
+            await closing
+
+            server = StorageServer(MemoryStorage(), path)
+            await server.start()
+            await client.save_many([_record(2)])
+            assert await client.load("hash2", 1) == b"data2"
+        finally:
+            storage.release.set()
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_tcp_requires_secret():
+    with pytest.raises(ValueError):
+        StorageServer(MemoryStorage(), ("127.0.0.1", 0))
+    with pytest.raises(ValueError):
+        RemoteStorage(("127.0.0.1", 8765))
+
+
+def test_tcp_handshake():
+    async def scenario():
+        server = StorageServer(MemoryStorage(), ("127.0.0.1", 0), secret=b"secret")
+        await server.start()
+        client = RemoteStorage(server.address, pool_size=1, secret=b"secret")
+        intruder = RemoteStorage(server.address, pool_size=1, secret=b"guess")
+        try:
+            with pytest.raises(RemoteStorageError):
+                await intruder.save_many([_record(1)])
+            await client.save_many([_record(2)])
+            assert await client.load("hash2", 1) == b"data2"
+        finally:
+            await intruder.close()
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_oversized_frame_closes_connection(tmp_path):
+    async def scenario():
+        server = StorageServer(MemoryStorage(), str(tmp_path / "storage.sock"), max_frame_size=1024)
+        await server.start()
+        reader, writer = await asyncio.open_unix_connection(server.address)
+        client = RemoteStorage(server.address, pool_size=1, max_frame_size=1024)
+        try:
+            writer.write(_HEADER.pack(0xFFFFFFFF, 1, _LOAD_MANY))
+            assert await asyncio.wait_for(reader.read(), 5) == b""
+            with pytest.raises(RemoteStorageError, match="max_frame_size"):
+                await client._request(_LOAD_MANY, bytes(2048))
+            # Большая пачка save_many уходит несколькими кадрами
+            await client.save_many([CallbackRecord(f"hash{index}", bytes(100), time.time(), 1) for index in range(30)])
+            assert await client.load("hash29", 1) == bytes(100)
+        finally:
+            writer.close()
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_loads_larger_than_frame_are_split(tmp_path):
+    async def scenario():
+        storage = MemoryStorage()
+        server = StorageServer(storage, str(tmp_path / "storage.sock"), max_frame_size=1024)
+        await server.start()
+        client = RemoteStorage(server.address, pool_size=1, max_frame_size=1024)
+        try:
+            await client.save_many([CallbackRecord(f"hash{index}", bytes([index]) * 300, time.time(), 1)
+                                    for index in range(20)])
+            # Запись, сохраненная в обход клиента, не помещается в кадр
+            await storage.save("big", bytes(2048), time.time(), 1)
+            loads = [client.load(f"hash{index}", 1) for index in range(20)]
+            results = await asyncio.gather(client.load("big", 1), *loads, return_exceptions=True)
+            assert isinstance(results[0], RemoteStorageError)
+            assert results[1:] == [bytes([index]) * 300 for index in range(20)]
+            assert await client.load("hash0", 1) == bytes(300)
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from aiogram_callback_manager import AsyncCallbackManager, DispatchOverloaded, DispatchScheduler, MemoryStorage
+from aiogram_callback_manager.messages import MockMessage
+
+
+def test_slots_are_handed_to_users_round_robin():
+    async def scenario():
+        scheduler = DispatchScheduler(max_concurrency=1)
+        gate = asyncio.Event()
+        order = []
+
+        async def job(name):
+            order.append(name)
+            await gate.wait()
+
+        running = asyncio.create_task(scheduler.submit(0, lambda: job("first")))
+        await asyncio.sleep(0)
+        # Пользователь 1 нажимает много раз, пользователь 2 — один раз после него
+        tasks = [asyncio.create_task(scheduler.submit(1, lambda index=index: job(f"u1-{index}"))) for index in range(3)]
+        tasks.append(asyncio.create_task(scheduler.submit(2, lambda: job("u2"))))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(running, *tasks)
+
+        assert order == ["first", "u1-0", "u2", "u1-1", "u1-2"]
+        assert scheduler.running == 0 and scheduler.backlog == 0
+
+    asyncio.run(scenario())
+
+
+def test_overflow_is_rejected_and_cancelled_waiters_are_skipped():
+    async def scenario():
+        scheduler = DispatchScheduler(max_concurrency=1, max_backlog=2, max_user_backlog=1)
+        gate = asyncio.Event()
+        done = []
+
+        async def job(name):
+            await gate.wait()
+            done.append(name)
+
+        running = asyncio.create_task(scheduler.submit(0, lambda: job("first")))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(scheduler.submit(1, lambda: job("cancelled")))
+        waiting = asyncio.create_task(scheduler.submit(2, lambda: job("waiting")))
+        await asyncio.sleep(0)
+
+        with pytest.raises(DispatchOverloaded):
+            await scheduler.submit(3, lambda: job("shed"))
+        cancelled.cancel()
+        gate.set()
+        await asyncio.gather(running, waiting)
+
+        assert done == ["first", "waiting"]
+        assert scheduler.running == 0 and scheduler.backlog == 0
+
+    asyncio.run(scenario())
+
+
+def test_shed_click_is_not_coalesced_with_retry(click):
+    async def scenario():
+        manager = AsyncCallbackManager(storage=MemoryStorage(), coalesce_window=5,
+                                       scheduler=DispatchScheduler(max_concurrency=1, max_backlog=0))
+        gate = asyncio.Event()
+        calls = []
+
+        async def slow(callback_query):
+            await gate.wait()
+
+        async def fast(callback_query):
+            calls.append(callback_query.from_user.id)
+
+        manager.register_handler(slow)
+        manager.register_handler(fast)
+        busy = await manager.create_button("slow", slow, 1)
+        button = await manager.create_button("fast", fast, 2)
+
+        blocking = asyncio.create_task(click(manager, busy, user_id=1))
+        await asyncio.sleep(0.01)
+        shed = await click(manager, button, user_id=2)
+        assert shed.answers == [(MockMessage.Overloaded, {})]
+        assert calls == []
+
+        gate.set()
+        await blocking
+        # Повтор в пределах окна выполняется, а не склеивается с отклоненным нажатием
+        retry = await click(manager, button, user_id=2)
+        assert calls == [2]
+        assert retry.answers == []
+
+        # А настоящий повтор выполненного нажатия склеивается
+        duplicate = await click(manager, button, user_id=2)
+        assert calls == [2]
+        assert duplicate.answers == [(None, {})]
+        await manager.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,69 @@
+import dataclasses
+import pickle
+from typing import List, Optional
+
+import pytest
+
+from aiogram_callback_manager import CompactSerializer, CompressedSerializer, JsonSerializer, PickleSerializer
+from aiogram_callback_manager.serializers import COMPACT_TAG, LZMA_TAG, ZLIB_TAG, loads
+
+
+@dataclasses.dataclass
+class Product:
+    id: int
+    name: str
+    price: float
+    tags: List[str] = dataclasses.field(default_factory=list)
+    parent: Optional["Product"] = None
+
+
+DATA = {
+    'handler_id': "0" * 32,
+    'args': [1, -2, 3.5, None, True, False],
+    'kwargs': {'element': Product(1, "Товар", 9.99, ["new"], Product(0, "Каталог", 0.0)), 'page': 3,
+               'raw': b"\x00\xff", 'pair': (1, "a"), 'ids': {4, 5}, 'big': 2 ** 70, 'negative': -2 ** 70},
+    'back_btn': None,
+}
+
+
+def test_compact_round_trip():
+    data_bytes = CompactSerializer().dumps(DATA)
+    assert data_bytes[0] == COMPACT_TAG
+    assert CompactSerializer().loads(data_bytes) == DATA
+
+
+def test_compact_is_smaller_than_pickle_for_button_data():
+    data = {'handler_id': "0" * 32, 'args': [], 'kwargs': {'element': Product(1, "Товар", 9.99), 'page': 3},
+            'back_btn': "cb_" + "0" * 32}
+    assert len(CompactSerializer().dumps(data)) < len(PickleSerializer().dumps(data))
+
+
+def test_compact_falls_back_to_pickle_for_unknown_types():
+    data = {'value': complex(1, 2)}
+    assert CompactSerializer().loads(CompactSerializer().dumps(data)) == data
+
+
+@pytest.mark.parametrize("method, tag", [("zlib", ZLIB_TAG), ("lzma", LZMA_TAG)])
+def test_compressed_round_trip(method, tag):
+    serializer = CompressedSerializer(PickleSerializer(), threshold=64, method=method)
+    data = {'text': "Назад " * 200}
+    data_bytes = serializer.dumps(data)
+    assert data_bytes[0] == tag
+    assert len(data_bytes) < len(pickle.dumps(data))
+    assert serializer.loads(data_bytes) == data
+
+    small = {'text': "a"}
+    assert serializer.dumps(small) == pickle.dumps(small)
+
+
+def test_formats_are_read_by_first_byte():
+    # Смена сериализатора не ломает уже сохраненные данные
+    data = {'handler_id': "abc", 'args': [1], 'kwargs': {'page': 2}, 'back_btn': None}
+    for serializer in (PickleSerializer(), JsonSerializer(), CompactSerializer(),
+                       CompressedSerializer(CompactSerializer(), threshold=0)):
+        assert loads(serializer.dumps(data)) == data
+
+
+def test_compressed_rejects_unknown_method():
+    with pytest.raises(ValueError):
+        CompressedSerializer(PickleSerializer(), method="brotli")
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import sqlite3
+import time
+
+from aiogram_callback_manager import CallbackRecord, SQLiteStorage
+
+
+def _hash(index: int) -> str:
+    return hashlib.md5(str(index).encode()).hexdigest()
+
+
+def _tables(path) -> set:
+    with sqlite3.connect(path) as connection:
+        return {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _create_v0(path, rows: int):
+    # Схема исходной версии: одна таблица callback_data
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE callback_data (hash TEXT PRIMARY KEY, data BLOB, created_at REAL, "
+                           "user_id BIG_INTEGER)")
+        connection.executemany("INSERT INTO callback_data VALUES (?, ?, ?, ?)",
+                               [(_hash(index), f"data{index}".encode(), time.time(), index % 7)
+                                for index in range(rows)])
+
+
+async def _create_v1(path, records):
+    storage = SQLiteStorage(str(path))
+    await storage.init_db()
+    await storage.save_many(records)
+    await storage.close()
+
+
+async def _load_all(storage: SQLiteStorage, rows: int):
+    return await asyncio.gather(*[storage.load(_hash(index), index % 7) for index in range(rows)])
+
+
+def test_v0_to_v2_migration_with_loads_during_copy(tmp_path):
+    path = tmp_path / "db.sqlite"
+    rows = 200
+    _create_v0(path, rows)
+    expected = [f"data{index}".encode() for index in range(rows)]
+
+    async def scenario():
+        storage = SQLiteStorage(str(path), schema=2, clean_batch_size=20, clean_pause=0.001)
+        await storage.init_db()
+        try:
+            # callback_data переносится в схему 1 сразу, а в схему 2 — порциями в фоне
+            assert storage._legacy
+            loads_during_copy = 0
+            while not storage._migration_task.done():
+                assert await _load_all(storage, rows) == expected
+                loads_during_copy += 1
+            assert loads_during_copy > 1
+
+            assert not storage._legacy
+            assert await _load_all(storage, rows) == expected
+            assert (await storage.stats())["rows"] == rows
+            entries = await storage.user_entries(3)
+            assert {entry[0] for entry in entries} == {_hash(index) for index in range(rows) if index % 7 == 3}
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+    assert {"callback_data", "callback_access", "callback_payload"}.isdisjoint(_tables(path))
+
+
+def test_close_and_reopen_during_migration(tmp_path):
+    path = tmp_path / "db.sqlite"
+    rows = 100
+    records = [CallbackRecord(_hash(index), f"data{index}".encode(), time.time(), index % 7) for index in range(rows)]
+    expected = [f"data{index}".encode() for index in range(rows)]
+
+    async def scenario():
+        await _create_v1(path, records)
+
+        storage = SQLiteStorage(str(path), schema=2, clean_batch_size=10, clean_pause=0.05)
+        await storage.init_db()
+        await asyncio.sleep(0.07)
+        await storage.close()
+
+        with sqlite3.connect(path) as connection:
+            left = connection.execute("SELECT COUNT(*) FROM callback_access").fetchone()[0]
+            moved = connection.execute("SELECT COUNT(*) FROM callback_access_v2").fetchone()[0]
+        assert 0 < left < rows and left + moved == rows
+
+        storage = SQLiteStorage(str(path), schema=2, clean_batch_size=10, clean_pause=0)
+        await storage.init_db()
+        try:
+            assert storage._legacy
+            await storage._migration_task
+            assert await _load_all(storage, rows) == expected
+            assert (await storage.stats())["rows"] == rows
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+    assert "callback_access" not in _tables(path)
+
+
+def test_clean_old_while_legacy_tables_exist(tmp_path):
+    path = tmp_path / "db.sqlite"
+    now = time.time()
+    # Четные записи устарели, нечетные свежие
+    records = [CallbackRecord(_hash(index), f"data{index}".encode(), now - 7200 if index % 2 == 0 else now, 1)
+               for index in range(40)]
+
+    async def scenario():
+        await _create_v1(path, records)
+
+        storage = SQLiteStorage(str(path), schema=2, clean_batch_size=10, clean_pause=0.05)
+        await storage.init_db()
+        try:
+            assert storage._legacy
+            assert await storage.clean_old(3600) == 20
+            loaded = await asyncio.gather(*[storage.load(_hash(index), 1) for index in range(40)])
+            assert loaded == [None if index % 2 == 0 else f"data{index}".encode() for index in range(40)]
+
+            await storage._migration_task
+            assert (await storage.stats())["rows"] == 20
+            assert {entry[0] for entry in await storage.user_entries(1)} == {_hash(index) for index in range(1, 40, 2)}
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())